@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Compares reading and converting an EDGES file with and without the
+address range attribute filter.
+
+    python3 benchmarks/bench_attribute_filter.py [tl_YYYY_SSCCC_edges.zip]
+
+Defaults to the 37143 test fixture.
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from lib.parse import open_layer, parse_shp_for_geom_and_tags, TAG_FIELDS
+from lib.convert import compile_nodelist, compile_waylist, addressways
+
+DEFAULT_FILENAME = os.path.join(os.path.dirname(__file__), '..',
+                                'tests', 'fixtures', 'tl_2020_37143_edges.zip')
+REPEAT = 5
+
+
+def best_time(func):
+    """ Fastest of REPEAT runs, in seconds """
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def convert(filename, address_only, fields):
+    parsed_features = parse_shp_for_geom_and_tags(filename, address_only, fields)
+    i, nodelist = compile_nodelist(parsed_features)
+    waylist = compile_waylist(parsed_features)
+    return addressways(waylist, nodelist, i)
+
+
+def main(filename):
+    _po_ds, po_layer = open_layer(filename)
+    total = po_layer.GetFeatureCount()
+    _po_ds, po_layer = open_layer(filename, address_only=True)
+    kept = po_layer.GetFeatureCount()
+
+    print("%s: %d features, %d with address ranges, %d (%.1f%%) skipped by the filter" % (
+        os.path.basename(filename), total, kept, total - kept, (total - kept) / total * 100))
+
+    assert convert(filename, False, None) == convert(filename, True, TAG_FIELDS)
+
+    for label, func in (
+            ('parse, all features', lambda: parse_shp_for_geom_and_tags(filename)),
+            ('parse, filtered', lambda: parse_shp_for_geom_and_tags(filename, True, TAG_FIELDS)),
+            ('convert, all features', lambda: convert(filename, False, None)),
+            ('convert, filtered', lambda: convert(filename, True, TAG_FIELDS))):
+        print("%-24s %8.3fs" % (label, best_time(func)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FILENAME)
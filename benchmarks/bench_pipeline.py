@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+Times each stage of the conversion of one EDGES file, and the postcode
+centroid calculation on its output.
+
+    python3 benchmarks/bench_pipeline.py [--repeat N] [tl_YYYY_SSCCC_edges.zip]
+    python3 benchmarks/bench_pipeline.py --synthetic 500000 [--pieces 50]
+
+Defaults to the 37143 test fixture. --synthetic generates an EDGES file of
+that many features first (see synthetic.py), to find out how the stages
+scale to counties the size of Los Angeles.
+"""
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from lib.parse import parse_shp_for_geom_and_tags, TAG_FIELDS
+from lib.convert import compile_nodelist, compile_waylist, addressways, CSV_FIELDNAMES
+from lib.helpers import round_point, glom_all, create_wkt_linestring
+from synthetic import generate
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+DEFAULT_FILENAME = os.path.join(ROOT, 'tests', 'fixtures', 'tl_2020_37143_edges.zip')
+
+
+def best_time(func, repeat):
+    """ Fastest of repeat runs, in seconds, and the result of the last one """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def segments_by_way(parsed_features):
+    """ The unglommed segments of each tiger:way_id, like compile_waylist sees them """
+    segments = {}
+    for geom, tags in parsed_features:
+        segments.setdefault(tags['tiger:way_id'], []).append(geom)
+    return list(segments.values())
+
+
+def main_way_points(waylist, nodelist):
+    """ The main ways as [(id, (lat, lon)), ...], the input create_wkt_linestring gets """
+    return [[nodelist[round_point(point)] for point in segment]
+            for segments in waylist.values() for segment in segments]
+
+
+def create_wkt_linestring_per_vertex(segment):
+    """ The former create_wkt_linestring, formatting one vertex at a time """
+    coord_pairs = []
+    for _i, point in segment:
+        coord_pairs.append("%f %f" % (point[1], point[0]))
+    return 'LINESTRING(' + ','.join(coord_pairs) + ')'
+
+
+def write_csv(csv_filename, csv_lines):
+    with open(csv_filename, 'w', encoding="utf8") as csv_file:
+        csv_writer = csv.DictWriter(csv_file, delimiter=';', fieldnames=CSV_FIELDNAMES)
+        csv_writer.writeheader()
+        csv_writer.writerows(csv_lines)
+
+
+def calculate_centroids(csv_filename):
+    with open(csv_filename, encoding="utf8") as csv_file:
+        subprocess.run([sys.executable, os.path.join(ROOT, 'calculate_postcode_centroids.py')],
+                       stdin=csv_file, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+
+
+def run(filename, repeat):
+    print("%s, best of %d" % (os.path.basename(filename), repeat))
+
+    def report(label, func, count_label, count=len):
+        seconds, result = best_time(func, repeat)
+        if count_label:
+            print("%-34s %9.3fs  %9d %s" % (label, seconds, count(result), count_label))
+        else:
+            print("%-34s %9.3fs" % (label, seconds))
+        return result
+
+    parsed_features = report('parse_shp_for_geom_and_tags',
+                             lambda: parse_shp_for_geom_and_tags(filename, True, TAG_FIELDS), 'features')
+    report('parse (batched)',
+           lambda: parse_shp_for_geom_and_tags(filename, True, TAG_FIELDS, batched=True), 'features')
+
+    i, nodelist = report('compile_nodelist', lambda: compile_nodelist(parsed_features), 'nodes',
+                         lambda result: len(result[1]))
+    waylist = report('compile_waylist', lambda: compile_waylist(parsed_features), 'ways')
+
+    grouped = segments_by_way(parsed_features)
+    report('glom_all', lambda: [glom_all(segments) for segments in grouped], 'ways')
+
+    csv_lines = report('addressways', lambda: addressways(waylist, nodelist, i), 'address ways')
+    report('addressways (numpy)', lambda: addressways(waylist, nodelist, i, 'numpy'), 'address ways')
+
+    segments = main_way_points(waylist, nodelist)
+    report('create_wkt_linestring', lambda: [create_wkt_linestring(segment) for segment in segments],
+           'linestrings')
+    report('create_wkt_linestring (per vertex)',
+           lambda: [create_wkt_linestring_per_vertex(segment) for segment in segments], 'linestrings')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_filename = os.path.join(tmpdir, 'out.csv')
+        write_csv(csv_filename, csv_lines)
+        report('calculate_postcode_centroids', lambda: calculate_centroids(csv_filename), '')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times the stages of the conversion')
+    parser.add_argument('filename', nargs='?', default=DEFAULT_FILENAME, help='tl_YYYY_SSCCC_edges.zip')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage (default: 3)')
+    parser.add_argument('--synthetic', type=int, metavar='EDGES',
+                        help='generate a synthetic EDGES file with this many features instead')
+    parser.add_argument('--pieces', type=int, default=50,
+                        help='maximum number of features of one synthetic TLID (default: 50)')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as synthetic_dir:
+            synthetic_filename = os.path.join(synthetic_dir, 'tl_2099_06037_edges.zip')
+            start = time.perf_counter()
+            generate(synthetic_filename, args.synthetic, args.pieces)
+            print("generated %d features in %.1fs" % (args.synthetic, time.perf_counter() - start))
+            run(synthetic_filename, args.repeat)
+    else:
+        run(args.filename, args.repeat)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+Generates a synthetic TIGER EDGES shapefile of any size, e.g. at the scale
+of Los Angeles county (~500,000 edges), including TLIDs made of many pieces
+in random order and direction.
+
+    python3 benchmarks/synthetic.py [--edges 500000] [--pieces 50] tl_2099_06037_edges.zip
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import zipfile
+
+try:
+    from osgeo import ogr, osr
+except (ImportError, ModuleNotFoundError):
+    import ogr
+    import osr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from lib.project import PROJCS_WKT
+
+# Same types and widths as in the EDGES files
+FIELDS = [
+    ('TLID', ogr.OFTInteger64, 10),
+    ('FULLNAME', ogr.OFTString, 100),
+    ('STATEFP', ogr.OFTString, 2),
+    ('COUNTYFP', ogr.OFTString, 3),
+    ('LFROMADD', ogr.OFTString, 12),
+    ('LTOADD', ogr.OFTString, 12),
+    ('RFROMADD', ogr.OFTString, 12),
+    ('RTOADD', ogr.OFTString, 12),
+    ('ZIPL', ogr.OFTString, 5),
+    ('ZIPR', ogr.OFTString, 5)
+]
+
+STREET_TYPES = ['St', 'Ave', 'Blvd', 'Rd', 'Dr', 'Way', 'Ln']
+
+# Roughly 100m apart, around downtown Los Angeles
+GRID_ORIGIN = (-118.60, 33.70)
+GRID_SPACING = 0.001
+GRID_SIZE = 600
+
+
+def random_path(rnd, vertices):
+    """ A wiggly line starting at a grid crossing, shared by many ways """
+    x = GRID_ORIGIN[0] + rnd.randrange(GRID_SIZE) * GRID_SPACING
+    y = GRID_ORIGIN[1] + rnd.randrange(GRID_SIZE) * GRID_SPACING
+    dx, dy = rnd.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+
+    path = [(x, y)]
+    for _ in range(vertices - 1):
+        x += dx * GRID_SPACING / 4 + rnd.uniform(-0.00005, 0.00005)
+        y += dy * GRID_SPACING / 4 + rnd.uniform(-0.00005, 0.00005)
+        path.append((round(x, 6), round(y, 6)))
+    return path
+
+
+def synthetic_ways(edges, pieces=50, many_pieces_share=0.02, address_share=0.6, seed=1):
+    """
+    Yields (tlid, tags, [geometry of each piece]) until edges pieces are
+    generated. many_pieces_share of the TLIDs are split in up to pieces
+    pieces, the rest in one to three.
+    """
+    rnd = random.Random(seed)
+    tlid = 100000000
+    count = 0
+
+    while count < edges:
+        tlid += 1
+        if rnd.random() < many_pieces_share:
+            piece_count = rnd.randint(2, max(2, pieces))
+        else:
+            piece_count = rnd.randint(1, 3)
+        piece_count = min(piece_count, edges - count)
+
+        path = random_path(rnd, piece_count * rnd.randint(2, 6) + 1)
+        cuts = sorted(rnd.sample(range(1, len(path) - 1), piece_count - 1)) if piece_count > 1 else []
+        geometries = []
+        for start, end in zip([0] + cuts, cuts + [len(path) - 1]):
+            geometry = path[start:end + 1]
+            if rnd.random() < 0.5:
+                geometry.reverse()
+            geometries.append(geometry)
+        rnd.shuffle(geometries)
+
+        tags = {'FULLNAME': '%s %s' % (rnd.randint(1, 2000), rnd.choice(STREET_TYPES))}
+        if rnd.random() < address_share:
+            start = rnd.randrange(1, 500) * 100
+            end = start + rnd.randrange(1, 50) * 2
+            zipcode = '9%04d' % rnd.randrange(1, 200)
+            tags.update({'LFROMADD': str(start), 'LTOADD': str(end),
+                         'RFROMADD': str(start + 1), 'RTOADD': str(end + 1),
+                         'ZIPL': zipcode, 'ZIPR': zipcode})
+
+        yield tlid, tags, geometries
+        count += piece_count
+
+
+def write_shapefile(shp_filename, ways, statefp='06', countyfp='037'):
+    """ Writes ways from synthetic_ways() as EDGES shapefile, returns the feature count """
+    ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
+    po_ds = ogr_driver.CreateDataSource(shp_filename)
+
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(PROJCS_WKT)
+    po_layer = po_ds.CreateLayer(os.path.basename(shp_filename)[:-len('.shp')], srs, ogr.wkbLineString)
+
+    for name, field_type, width in FIELDS:
+        field_definition = ogr.FieldDefn(name, field_type)
+        field_definition.SetWidth(width)
+        po_layer.CreateField(field_definition)
+
+    count = 0
+    for tlid, tags, geometries in ways:
+        for geometry in geometries:
+            po_feature = ogr.Feature(po_layer.GetLayerDefn())
+            po_feature.SetField('TLID', tlid)
+            po_feature.SetField('STATEFP', statefp)
+            po_feature.SetField('COUNTYFP', countyfp)
+            for name, value in tags.items():
+                po_feature.SetField(name, value)
+
+            line = ogr.Geometry(ogr.wkbLineString)
+            for x, y in geometry:
+                line.AddPoint_2D(x, y)
+            po_feature.SetGeometry(line)
+
+            po_layer.CreateFeature(po_feature)
+            count += 1
+
+    # Closes and flushes the file
+    po_ds = None
+    return count
+
+
+def generate(filename, edges, pieces=50, seed=1, statefp='06', countyfp='037'):
+    """
+    Writes a synthetic EDGES file with edges features. filename may end in
+    .shp or .zip (then the shapefile gets zipped like the Census Bureau does).
+    """
+    ways = synthetic_ways(edges, pieces=pieces, seed=seed)
+
+    if not filename.endswith('.zip'):
+        return write_shapefile(filename, ways, statefp, countyfp)
+
+    basename = os.path.basename(filename)[:-len('.zip')]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        count = write_shapefile(os.path.join(tmpdir, basename + '.shp'), ways, statefp, countyfp)
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for extension in ('.shp', '.shx', '.dbf', '.prj'):
+                zip_file.write(os.path.join(tmpdir, basename + extension), basename + extension)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic TIGER EDGES file')
+    parser.add_argument('filename', help='tl_YYYY_SSCCC_edges.zip or .shp')
+    parser.add_argument('--edges', type=int, default=500000, help='number of features (default: 500000)')
+    parser.add_argument('--pieces', type=int, default=50,
+                        help='maximum number of features of one TLID (default: 50)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print("Wrote %d features." % generate(args.filename, args.edges, args.pieces, args.seed))
@@ -15,85 +15,46 @@ postcode,lat,lon
 00535;43.089300;-72.613680
 00586;18.343681;-67.028427
 00601;18.181632;-66.757545
-"""
-from collections import defaultdict
-from statistics import mean, median
-from math import sqrt
-import sys
-import csv
-import re
-import logging
-
-LOG = logging.getLogger()
-
-postcode_summary = defaultdict(list)
-
-reader = csv.DictReader(sys.stdin, delimiter=';')
-
-def dist(p1, p2):
-    return sqrt((p1[0]-p2[0])**2+(p1[1]-p2[1])**2)
-
-LOG.warning("Reading Postcodes")
-
-cnt = 0
-for row in reader:
-
-    postcode = row['postcode']
-
-    # In rare cases the postcode might be empty
-    if not re.match(r'^\d\d\d\d\d$', postcode):
-        continue
-
-    # If you 'cat *.csv' then you might end up with multiple CSV header lines.
-    # Skip those
-    if row['geometry'] == 'geometry':
-        continue
-
-    result = re.match(r'LINESTRING\((.+)\)$', row['geometry'])
-
-    # Fail if geometry can't be parsed. Shouldn't happen because it's one of
-    # our scripts that created them.
-    assert result
 
-    points = result[1].split(',')
-    postcode_summary[postcode].append([float(p) for p in points[int(len(points)/2)].split(' ')])
+Instead of STDIN it can read a directory of CSV files (e.g. the output
+directory of convert.sh), which get read by parallel worker processes:
 
-    cnt += 1
+    ./calculate_postcode_centroids.py [--workers N] tiger/ > us_postcodes.csv
 
-    if cnt % 1000000 == 0:
-        LOG.warning("Processed %s lines.", cnt)
-
-LOG.warning("%s lines read.", cnt)
-
-writer = csv.DictWriter(sys.stdout, delimiter=',',
-                        fieldnames=['postcode', 'lat', 'lon'],
-                        lineterminator='\n')
-writer.writeheader()
-
-maxdists = [0.1, 0.3, 0.5, 0.9]
-
-for postcode in sorted(postcode_summary):
-    points = postcode_summary[postcode]
-
-    centroid = [median(p) for p in zip(*points)]
-
-    for mxd in maxdists:
-        filtered = [p for p in points if dist(centroid, p) < mxd]
-
-        if len(filtered) < 0.7 * len(points):
-            continue
-
-        if len(filtered) < len(points):
-            LOG.warning("%s: Found %d outliers in %d points.", postcode, - len(filtered) + len(points), len(points))
-            points = filtered
-
-        centroid = [mean(p) for p in zip(*points)]
-
-        writer.writerow({
-            'postcode': postcode,
-            'lat': round(centroid[1], 6),
-            'lon': round(centroid[0], 6)
-        })
-        break
+With --memory-budget the points are kept in compact buffers that get spilled
+to temporary files when they grow beyond the budget, and the postcodes are
+processed in partitions.
+"""
+import argparse
+import sys
+import tempfile
+
+from lib.postcodes import read_midpoints, iter_midpoints, read_midpoints_directory, calculate_centroids, \
+                          write_centroids, MidpointSpool, calculate_centroids_out_of_core
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calculates a center point for each postcode')
+    parser.add_argument('path', nargs='?', help='directory with CSV files (default: read STDIN)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of files read in parallel (default: number of CPUs)')
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help='keep at most that many MB of points in memory, spill the rest to disk')
+    args = parser.parse_args()
+
+    if args.memory_budget:
+        with tempfile.TemporaryDirectory(prefix='postcodes-') as tmpdir:
+            spool = MidpointSpool(tmpdir, args.memory_budget * 1024 * 1024)
+            if args.path:
+                read_midpoints_directory(args.path, args.workers, spool)
+            else:
+                for postcode, point in iter_midpoints(sys.stdin):
+                    spool.add(postcode, point)
+
+            write_centroids(sys.stdout, calculate_centroids_out_of_core(spool))
     else:
-        LOG.warning("%s: Dropped.", postcode)
+        if args.path:
+            postcode_summary = read_midpoints_directory(args.path, args.workers)
+        else:
+            postcode_summary = read_midpoints(sys.stdin)
+
+        write_centroids(sys.stdout, calculate_centroids(postcode_summary))
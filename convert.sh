@@ -13,36 +13,5 @@ if [[ ! -d "$OUTPATH" ]]; then
     exit 1
 fi
 
-INREGEX='_([0-9]{5})_edges.zip'
-WORKPATH="$OUTPATH/tmp-workdir/"
-mkdir -p "$WORKPATH"
-
-
-
-INFILES=($INPATH/*.zip)
-echo "Found ${#INFILES[*]} files."
-
-for F in ${INFILES[*]}; do
-    # echo $F
-
-    if [[ "$F" =~ $INREGEX ]]; then
-        COUNTYID=${BASH_REMATCH[1]}
-        SHAPEFILE="$WORKPATH/$(basename $F '.zip').shp"
-        CSVFILE="$OUTPATH/$COUNTYID.csv"
-
-        unzip -o -q -d "$WORKPATH" "$F"
-        if [[ ! -e "$SHAPEFILE" ]]; then
-            echo "Unzip failed. $SHAPEFILE not found."
-            exit 1
-        fi
-
-        ./tiger_address_convert.py "$SHAPEFILE" "$CSVFILE"
-
-        rm $WORKPATH/*
-    fi
-done
-
-OUTFILES=($OUTPATH/*.csv)
-echo "Wrote ${#OUTFILES[*]} files."
-
-rmdir $WORKPATH
+# Any further options (e.g. --workers 8) are passed on
+exec ./tiger_address_convert_all.py "$INPATH" "$OUTPATH" "${@:3}"
@@ -0,0 +1,314 @@
+"""
+Convert a whole directory of TIGER EDGES zip files, one county per worker
+process
+"""
+
+import os
+import re
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+from .convert import shape_to_csv, read_shape, compile_addressways, write_addressways, output_extension, \
+                     CSV_FIELDNAMES, TLID_CSV_FIELDNAMES
+from .output import SingleFile
+from .cache import cache_path
+from .instrument import Instrumentation, append_report, summarize
+from .manifest import converter_version, conversion_parameters, manifest_entry, is_up_to_date, \
+                      read_manifest, append_manifest, write_manifest
+
+# e.g. tl_2020_37143_edges.zip
+INFILE_REGEX = re.compile(r'_([0-9]{5})_edges\.zip$')
+
+# Counties waiting between the stages of a pipelined worker. Each one holds
+# the parsed features or output rows of a whole county in memory.
+PIPELINE_QUEUE_SIZE = 1
+
+# Seconds to wait for a result before checking whether the pipelined
+# workers are still alive
+RESULT_POLL_INTERVAL = 1
+
+
+def find_county_files(inpath):
+    """
+    Returns a list of (countyid, filename) for every EDGES zip file in
+    the directory. Largest files come first so the biggest counties don't
+    end up at the tail of a parallel run.
+    """
+    county_files = []
+    for filename in os.listdir(inpath):
+        result = INFILE_REGEX.search(filename)
+        if result:
+            county_files.append((result[1], os.path.join(inpath, filename)))
+
+    county_files.sort(key=lambda county_file: (-os.path.getsize(county_file[1]), county_file[0]))
+    return county_files
+
+
+def convert_county(countyid, zip_filename, csv_filename, options, previous_entry=None, version=None,
+                   cache_dir=None):
+    """
+    Converts one county, reading straight from the zip file. The CSV file
+    only appears under its final name once it is complete. options are
+    passed on to shape_to_csv.
+    If previous_entry (from the manifest) shows that the existing CSV file
+    was created from the same input with the same converter version and
+    options, nothing is done.
+    cache_dir: see shape_to_csv
+    Returns the manifest entry, whether the county was converted and the
+    instrumentation record of the conversion (None if skipped).
+    """
+    parameters = conversion_parameters(options)
+    if is_up_to_date(previous_entry, zip_filename, csv_filename, version, parameters):
+        return previous_entry, False, None
+
+    instrumentation = Instrumentation(county=countyid, input=os.path.basename(zip_filename))
+    shape_to_csv(zip_filename, csv_filename + '.tmp', instrumentation=instrumentation, cache_dir=cache_dir,
+                 **options)
+    os.replace(csv_filename + '.tmp', csv_filename)
+
+    return manifest_entry(countyid, zip_filename, csv_filename, version, parameters), True, \
+        instrumentation.record()
+
+
+def convert_pooled(jobs, workers, options, version, cache_dir=None):
+    """
+    Converts each county of jobs [(countyid, zip_filename, csv_filename,
+    previous_entry), ...] with convert_county in a pool of processes.
+    Yields (countyid, csv_filename, result of convert_county, exception)
+    as they complete.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for countyid, zip_filename, csv_filename, previous_entry in jobs:
+            future = executor.submit(convert_county, countyid, zip_filename, csv_filename, options,
+                                     previous_entry, version, cache_dir)
+            futures[future] = countyid, csv_filename
+
+        for future in as_completed(futures):
+            countyid, csv_filename = futures[future]
+            try:
+                yield countyid, csv_filename, future.result(), None
+            except Exception as exc: # pylint: disable=broad-except
+                yield countyid, csv_filename, None, exc
+
+
+def convert_pipelined(jobs, workers, options, version, cache_dir=None):
+    """
+    Same as convert_pooled, but every worker process runs pipeline_worker:
+    it reads the next county while converting the current one and writing
+    the previous one.
+    """
+    workers = workers or os.cpu_count()
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        job_queue = manager.Queue()
+        results = manager.Queue()
+        for job in jobs:
+            job_queue.put(job)
+        for _ in range(workers):
+            job_queue.put(None)
+
+        futures = [executor.submit(pipeline_worker, job_queue, results, options, version, cache_dir)
+                   for _ in range(workers)]
+
+        pending = {countyid: csv_filename for countyid, _zip_filename, csv_filename, _entry in jobs}
+        worker_error = None
+        while pending:
+            try:
+                countyid, result, exc = results.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                if not all(future.done() for future in futures):
+                    continue
+                # the last results may have come in between the poll and
+                # the workers ending
+                try:
+                    countyid, result, exc = results.get_nowait()
+                except queue.Empty:
+                    break
+            if countyid not in pending:
+                # a thread of a worker failed between counties
+                worker_error = exc
+                continue
+            yield countyid, pending.pop(countyid), result, exc
+
+        if pending:
+            # a worker process died, e.g. crashed in GDAL
+            error = next((future.exception() for future in futures if future.exception()), worker_error)
+            for countyid, csv_filename in pending.items():
+                yield countyid, csv_filename, None, error or RuntimeError("worker process ended")
+
+
+def pipeline_worker(job_queue, results, options, version, cache_dir=None, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Converts counties from job_queue until it returns None, in three
+    stages connected by bounded queues: a reader thread checks the
+    manifest entry and parses the shapefile (I/O and decompression), this
+    thread computes the address ways, a writer thread writes them. Puts
+    (countyid, result of convert_county, exception) on results.
+    """
+    computing = queue.Queue(maxsize=queue_size)
+    writing = queue.Queue(maxsize=queue_size)
+    parameters = conversion_parameters(options)
+    address_only = options.get('address_only', True)
+
+    def read():
+        countyid = None
+        try:
+            while True:
+                countyid = None
+                job = job_queue.get()
+                if job is None:
+                    return
+                countyid, zip_filename, csv_filename, previous_entry = job
+                try:
+                    if is_up_to_date(previous_entry, zip_filename, csv_filename, version, parameters):
+                        results.put((countyid, (previous_entry, False, None), None))
+                        continue
+                    # stages of the three threads overlap, see Instrumentation
+                    instrumentation = Instrumentation(reset_peak=False, county=countyid,
+                                                      input=os.path.basename(zip_filename))
+                    cache = cache_path(cache_dir, zip_filename, address_only) if cache_dir else None
+                    parsed = read_shape(zip_filename, address_only, options.get('batched', False),
+                                        options.get('nodestore', False) or cache is not None, instrumentation,
+                                        cache)
+                except Exception as exc: # pylint: disable=broad-except
+                    results.put((countyid, None, exc))
+                    continue
+                computing.put((job, instrumentation, parsed, cache))
+                del parsed
+        except Exception as exc: # pylint: disable=broad-except
+            # e.g. the job queue is gone, countyid is None between counties
+            results.put((countyid, None, exc))
+        finally:
+            computing.put(None)
+
+    def write():
+        done = False
+        try:
+            while True:
+                item = writing.get()
+                if item is None:
+                    done = True
+                    return
+                (countyid, zip_filename, csv_filename, _entry), instrumentation, csv_lines = item
+                del item
+                try:
+                    write_addressways(csv_filename + '.tmp', csv_lines, options.get('tlid', False),
+                                      options.get('compression'), options.get('output_format', 'csv'),
+                                      instrumentation)
+                    del csv_lines
+                    os.replace(csv_filename + '.tmp', csv_filename)
+                    entry = manifest_entry(countyid, zip_filename, csv_filename, version, parameters)
+                    record = instrumentation.record()
+                except Exception as exc: # pylint: disable=broad-except
+                    results.put((countyid, None, exc))
+                    continue
+                results.put((countyid, (entry, True, record), None))
+        except Exception as exc: # pylint: disable=broad-except
+            results.put((None, None, exc))
+        finally:
+            # don't leave the computing thread blocked on a full queue
+            while not done:
+                done = writing.get() is None
+
+    reader = threading.Thread(target=read, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        while True:
+            item = computing.get()
+            if item is None:
+                break
+            job, instrumentation, parsed, cache = item
+            del item
+            try:
+                csv_lines = compile_addressways(parsed, options.get('nodestore', False) or cache is not None,
+                                                options.get('engine', 'scalar'), options.get('tlid', False),
+                                                options.get('output_format', 'csv'), instrumentation, cache)
+            except Exception as exc: # pylint: disable=broad-except
+                results.put((job[0], None, exc))
+                continue
+            finally:
+                del parsed
+            writing.put((job, instrumentation, csv_lines))
+            del csv_lines
+        reader.join()
+    finally:
+        writing.put(None)
+        writer.join()
+
+
+def convert_all(inpath, outpath, workers=None, options=None, force=False, report_filename=None,
+                single_filename=None, pipeline=False, cache_dir=None):
+    """
+    Converts every county in inpath to outpath/<countyid>.csv using a pool
+    of worker processes (default: one per CPU). Counties which are unchanged
+    according to the manifest in outpath are skipped, unless force is set.
+    With options['compression'] the files are <countyid>.csv.gz or .csv.zst,
+    with options['output_format'] <countyid>.pgcopy or .parquet.
+    With report_filename, the timings and memory use of the stages of each
+    converted county get appended there as JSON lines and a roll up is
+    printed at the end.
+    With single_filename, all counties also get appended to that one file
+    (same compression, one header) as they are done.
+    With pipeline, each worker overlaps reading, converting and writing of
+    consecutive counties (see pipeline_worker), not with options['streaming'].
+    With cache_dir, the parsed and compiled counties are saved there and
+    loaded on later runs instead of parsing the shapefiles (see lib.cache).
+    Returns the list of countyids that failed.
+    """
+    options = options or {}
+    if pipeline and options.get('streaming'):
+        raise ValueError("The pipeline can't be combined with streaming")
+    county_files = find_county_files(inpath)
+    print("Found %d files." % len(county_files))
+
+    extension = output_extension(options.get('output_format', 'csv'), options.get('compression'))
+    single_file = None
+    if single_filename:
+        if options.get('output_format', 'csv') != 'csv':
+            raise ValueError("A single file can only be written for CSV output")
+        fieldnames = TLID_CSV_FIELDNAMES if options.get('tlid') else CSV_FIELDNAMES
+        single_file = SingleFile(single_filename, fieldnames, options.get('compression'))
+
+    manifest = {} if force else read_manifest(outpath)
+    version = converter_version()
+
+    jobs = [(countyid, zip_filename, os.path.join(outpath, countyid + extension), manifest.get(countyid))
+            for countyid, zip_filename in county_files]
+    convert = convert_pipelined if pipeline else convert_pooled
+
+    failed = []
+    skipped = 0
+    records = []
+    for countyid, csv_filename, result, exc in convert(jobs, workers, options, version, cache_dir):
+        if exc is not None:
+            print("Failed to convert %s: %s" % (countyid, exc))
+            manifest.pop(countyid, None)
+            failed.append(countyid)
+            continue
+
+        entry, converted, record = result
+        if converted:
+            append_manifest(outpath, entry)
+            if report_filename:
+                append_report(report_filename, record)
+                records.append(record)
+        else:
+            skipped += 1
+        manifest[countyid] = entry
+
+        if single_file:
+            single_file.append(csv_filename)
+
+    write_manifest(outpath, manifest)
+    if single_file:
+        single_file.close()
+
+    print("Skipped %d unchanged counties." % skipped)
+    print("Wrote %d files." % (len(county_files) - len(failed) - skipped))
+    if records:
+        print("\n".join(summarize(records)))
+    return sorted(failed)
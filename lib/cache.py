@@ -0,0 +1,163 @@
+"""
+Cache of the compiled nodes and waylist of a county, so that runs with
+changed address way parameters or code don't parse the shapefiles with
+GDAL again. Each county is a directory of .npy files (loaded memory
+mapped, without copying) plus the strings of the attribute table, named
+by the SHA-256 of the input files and of the code that computes the data.
+
+    lat.npy, lon.npy   float64, the NodeStore
+    nodes.npy          int32, node indices of all chains one after another
+    chains.npy         int64, chain i is nodes[chains[i]:chains[i + 1]]
+    ways.npy           int64, the chains of way j are chains ways[j] to ways[j + 1]
+    tlid.npy           int64, TLID of each way
+    attributes.npy     int32, (ways, len(ATTRIBUTES)) indices into strings.json, -1 if unset
+    strings.json       the distinct attribute values
+"""
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+
+from .helpers import files_sha256
+from .nodestore import NodeStore
+from .record import AddressRecord
+
+# Increase when the format of the cache changes
+CACHE_VERSION = 2
+
+# Files of a shapefile besides the .shp that its features depend on
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# The code that the cached data comes from: whole modules of the lib
+# package, the data files they read and functions of lib.convert (not the
+# whole module, so tuning the address ways keeps the cache)
+CACHED_MODULES = ('cache.py', 'helpers.py', 'nodestore.py', 'parse.py', 'project.py', 'record.py',
+                  '../tiger_county_fips.json')
+CACHED_FUNCTIONS = ('compile_waylist', 'compile_nodestore_and_waylist')
+
+# AddressRecord attributes of the attribute table and their tags
+ATTRIBUTES = (
+    ('name', 'name'),
+    ('county', 'tiger:county'),
+    ('state', 'tiger:state'),
+    ('lfromadd', 'tiger:lfromadd'),
+    ('ltoadd', 'tiger:ltoadd'),
+    ('rfromadd', 'tiger:rfromadd'),
+    ('rtoadd', 'tiger:rtoadd'),
+    ('zip_left', 'tiger:zip_left'),
+    ('zip_right', 'tiger:zip_right')
+)
+
+
+def input_files(filename):
+    """
+    The files a shapefile consists of: a zip file contains all of them,
+    a .shp comes with the .shx, .dbf etc. next to it
+    """
+    base, extension = os.path.splitext(filename)
+    if extension.lower() != '.shp':
+        return [filename]
+    return [base + sidecar for sidecar in SHAPEFILE_EXTENSIONS if os.path.exists(base + sidecar)]
+
+
+@lru_cache(maxsize=1)
+def code_version():
+    """ Hash of the code and data files that compute the cached data """
+    directory = os.path.dirname(__file__)
+    sha256 = hashlib.sha256(files_sha256([os.path.join(directory, module) for module in CACHED_MODULES])
+                            .encode('ascii'))
+
+    with open(os.path.join(directory, 'convert.py'), encoding='utf8') as file:
+        source = file.read()
+    functions = {node.name: ast.get_source_segment(source, node) for node in ast.parse(source).body
+                 if isinstance(node, ast.FunctionDef)}
+    for name in CACHED_FUNCTIONS:
+        sha256.update(functions[name].encode('utf8'))
+    return sha256.hexdigest()[:16]
+
+
+def cache_path(cache_dir, shp_filename, address_only=True):
+    """ Directory of the cache of a shapefile, by its contents and code_version """
+    return os.path.join(cache_dir, '%s-%s-%s-v%d' % (files_sha256(input_files(shp_filename)),
+                                                     'address' if address_only else 'all', code_version(),
+                                                     CACHE_VERSION))
+
+
+def save_cache(path, nodestore, waylist):
+    """
+    Writes the NodeStore and waylist (of compile_nodestore_and_waylist) to
+    the directory path. It appears under that name once complete.
+    """
+    chains = [chain for segments in waylist.values() for chain in segments]
+    chain_offsets = np.zeros(len(chains) + 1, dtype=np.int64)
+    np.cumsum([len(chain) for chain in chains], out=chain_offsets[1:])
+    way_offsets = np.zeros(len(waylist) + 1, dtype=np.int64)
+    np.cumsum([len(segments) for segments in waylist.values()], out=way_offsets[1:])
+
+    strings = {}
+    attributes = np.full((len(waylist), len(ATTRIBUTES)), -1, dtype=np.int32)
+    for i, record in enumerate(waylist):
+        for j, (attribute, _tag) in enumerate(ATTRIBUTES):
+            value = getattr(record, attribute)
+            if value is not None:
+                attributes[i, j] = strings.setdefault(value, len(strings))
+
+    arrays = {
+        'lat': nodestore.lat,
+        'lon': nodestore.lon,
+        'nodes': np.concatenate(chains).astype(np.int32) if chains else np.zeros(0, dtype=np.int32),
+        'chains': chain_offsets,
+        'ways': way_offsets,
+        'tlid': np.array([record.tlid for record in waylist], dtype=np.int64),
+        'attributes': attributes
+    }
+
+    tmp_path = path + '.tmp.%d' % os.getpid()
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_path, 'strings.json'), 'w', encoding='utf8') as file:
+        json.dump(list(strings), file)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # written by another process in the meantime
+        shutil.rmtree(tmp_path)
+
+
+def load_cache(path, non_integer=None):
+    """
+    The NodeStore and waylist saved in the directory path, None if there
+    is no cache. The arrays are memory mapped, the chains are views of
+    them. non_integer: Counter of the non integer address range values
+    """
+    if not os.path.isdir(path):
+        return None
+
+    def load(name):
+        # plain ndarray view of the memory map, indexing np.memmap is slower
+        return np.asarray(np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+
+    with open(os.path.join(path, 'strings.json'), encoding='utf8') as file:
+        strings = json.load(file)
+
+    nodes = load('nodes')
+    chain_offsets = load('chains').tolist()
+    way_offsets = load('ways').tolist()
+
+    waylist = {}
+    for i, (tlid, attributes) in enumerate(zip(load('tlid').tolist(), load('attributes').tolist())):
+        tags = {'tiger:way_id': tlid}
+        for (_attribute, tag), index in zip(ATTRIBUTES, attributes):
+            if index >= 0:
+                tags[tag] = strings[index]
+        waylist[AddressRecord(tags, non_integer)] = [nodes[chain_offsets[j]:chain_offsets[j + 1]]
+                                                    for j in range(way_offsets[i], way_offsets[i + 1])]
+
+    return NodeStore(load('lat'), load('lon')), waylist
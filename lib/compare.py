@@ -0,0 +1,126 @@
+"""
+Differences between two postcode centroid files (e.g. of two TIGER
+releases), used by compare_postcode_centroids.py
+"""
+
+import csv
+
+import numpy as np
+
+# Earth radius in meters
+EARTH_RADIUS = 6372800
+
+# Upper limits of the histogram buckets of the distances moved, in meters
+DISTANCE_BUCKETS = [1, 10, 100, 1000, 10000, 100000, np.inf]
+
+
+class CentroidTable:
+    """ Postcode centroids as arrays sorted by postcode """
+    __slots__ = ('postcodes', 'lat', 'lon')
+
+    def __init__(self, postcodes, lat, lon):
+        order = np.argsort(postcodes, kind='stable')
+        self.postcodes = np.asarray(postcodes)[order]
+        self.lat = np.asarray(lat, dtype=np.float64)[order]
+        self.lon = np.asarray(lon, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.postcodes)
+
+
+def read_centroids(filename):
+    """ Reads a postcode,lat,lon file as written by calculate_postcode_centroids.py """
+    postcodes = []
+    lats = []
+    lons = []
+    with open(filename, encoding='utf8') as file:
+        for row in csv.DictReader(file):
+            postcodes.append(row['postcode'])
+            lats.append(float(row['lat']))
+            lons.append(float(row['lon']))
+
+    return CentroidTable(np.array(postcodes, dtype=str), lats, lons)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ Distance in meters, for arrays of coordinates """
+    # https://janakiev.com/blog/gps-points-distance-python/
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+
+    return 2*EARTH_RADIUS*np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class CentroidDiff:
+    """
+    Postcodes added and deleted between two CentroidTables, and those
+    whose position moved with old and new position and the distance
+    """
+
+    def __init__(self, old, new):
+        self.old_count = len(old)
+        self.new_count = len(new)
+
+        common, old_index, new_index = np.intersect1d(old.postcodes, new.postcodes,
+                                                      assume_unique=True, return_indices=True)
+        self.added = np.setdiff1d(new.postcodes, common, assume_unique=True)
+        self.deleted = np.setdiff1d(old.postcodes, common, assume_unique=True)
+
+        moved = (old.lat[old_index] != new.lat[new_index]) | (old.lon[old_index] != new.lon[new_index])
+        self.moved = common[moved]
+        self.old_lat = old.lat[old_index][moved]
+        self.old_lon = old.lon[old_index][moved]
+        self.new_lat = new.lat[new_index][moved]
+        self.new_lon = new.lon[new_index][moved]
+        self.distances = haversine(self.old_lat, self.old_lon, self.new_lat, self.new_lon)
+
+    def moved_more_than(self, meters):
+        return int(np.count_nonzero(self.distances > meters))
+
+    def histogram(self, buckets=None):
+        """ List of (upper limit in meters, number of moved postcodes up to it) """
+        buckets = DISTANCE_BUCKETS if buckets is None else buckets
+        counts = np.bincount(np.searchsorted(buckets, self.distances), minlength=len(buckets))
+        return list(zip(buckets, counts[:len(buckets)].tolist()))
+
+    def write_moved(self, filename):
+        """ CSV file of the moved postcodes, furthest moved first """
+        order = np.argsort(-self.distances, kind='stable')
+        with open(filename, 'w', encoding='utf8') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(['postcode', 'old_lat', 'old_lon', 'new_lat', 'new_lon', 'distance'])
+            for i in order.tolist():
+                writer.writerow([self.moved[i], self.old_lat[i], self.old_lon[i],
+                                 self.new_lat[i], self.new_lon[i], '%.1f' % self.distances[i]])
+
+    def summary(self):
+        """ The report as list of lines """
+        def share(count):
+            return count / self.new_count * 100 if self.new_count else 0.0
+
+        lines = [
+            'Added: %d (%.3f%%)' % (len(self.added), share(len(self.added))),
+            'Deleted: %d (%.3f%%)' % (len(self.deleted), share(len(self.deleted))),
+            'Position moved: %d (%.3f%%)' % (len(self.moved), share(len(self.moved)))
+        ]
+        for meters in (100, 1000, 10000):
+            count = self.moved_more_than(meters)
+            lines.append('Position moved more than %d meters: %d (%.3f%%)' % (meters, count, share(count)))
+
+        if len(self.moved):
+            lines.append('Average distance difference of all updates: %0.2f meters' % np.mean(self.distances))
+        else:
+            lines.append('Average distance difference of all updates: -')
+
+        lines.append('Distance moved:')
+        lower = 0
+        for upper, count in self.histogram():
+            if upper == np.inf:
+                lines.append('  more than %d meters: %d' % (lower, count))
+            else:
+                lines.append('  up to %d meters: %d' % (upper, count))
+            lower = upper
+        return lines
@@ -1,8 +1,23 @@
 
 import math
-
-from .project import unproject
-from .helpers import round_point, glom_all, length, check_if_integers, interpolation_type, create_wkt_linestring
+from collections import Counter
+from functools import partial
+from itertools import groupby
+
+import numpy as np
+
+from .parse import parse_shp_for_geom_and_tags, iter_shp_for_geom_and_tags, \
+                   parse_shp_for_coords_and_tags, TAG_FIELDS
+from .project import unproject_points
+from .offset import offset_ways as numpy_offset_ways
+from .nodestore import NodeStore, compile_nodestore, node_index
+from .instrument import Instrumentation, counted
+from .output import write_csv, COMPRESSIONS
+from .pgcopy import write_pgcopy, SRID as PGCOPY_SRID
+from .geoparquet import write_geoparquet
+from .record import AddressRecord, non_integer_summary
+from .cache import cache_path, save_cache, load_cache
+from .helpers import round_point, glom_all, length, create_wkt_linestring, create_wkb_linestring
 
 
 # Sets the distance that the address ways should be from the main way, in feet.
@@ -16,197 +31,523 @@ ADDRESS_PULLBACK = 45
 # The approximate number of feet in one degree of latitude
 LAT_FEET = 364613
 
-
-def addressways(waylist, nodelist, first_way_id):
+CSV_FIELDNAMES = [
+    'from',
+    'to',
+    'interpolation',
+    'street',
+    'city',
+    'state',
+    'postcode',
+    'geometry'
+]
+
+# With the TLID of the edge as first column, see addressways(tlid=True)
+TLID_CSV_FIELDNAMES = ['tlid'] + CSV_FIELDNAMES
+
+# Writer, geometry serialiser and whether from/to are ints (see
+# addressways(int_ranges=True)) of each output format
+OUTPUT_FORMATS = {
+    'csv': (write_csv, create_wkt_linestring, False),
+    'pgcopy': (write_pgcopy, partial(create_wkb_linestring, srid=PGCOPY_SRID), True),
+    'parquet': (write_geoparquet, create_wkb_linestring, True)
+}
+
+
+def output_extension(output_format='csv', compression=None):
+    """ File name extension of the output, e.g. '.csv.gz' """
+    if output_format == 'parquet':
+        return '.parquet'
+    return '.' + output_format + COMPRESSIONS[compression]
+
+
+def addressways(waylist, nodelist, first_way_id, engine='scalar', tlid=False, geometry=create_wkt_linestring,
+                int_ranges=False):
+    """
+    Creates the address ways left and right of every segment with an
+    address range. nodelist is either the dict from compile_nodelist or a
+    NodeStore (with segments made of node indices).
+    engine: 'scalar' computes them point by point with offset_ways,
+    'numpy' all at once with lib.offset.offset_ways (same result within
+    1e-6 degrees)
+    tlid: add the TLID (tiger:way_id) of the edge as 'tlid'
+    geometry: creates the 'geometry' from the [(id, (lat, lon)), ...] of
+    an address way, WKT by default
+    int_ranges: 'from' and 'to' as the parsed ints instead of the strings
+    of the tags (for the binary output formats)
+    """
     way_id = first_way_id
-    distance = float(ADDRESS_DISTANCE)
     output = []
+    key = node_index if isinstance(nodelist, NodeStore) else round_point
+    if engine == 'numpy':
+        offset_segments, way_id = numpy_address_segments(waylist, nodelist, way_id)
+        offset_segments = iter(offset_segments)
+
+    for record, segments in waylist.items():
+        right = record.right
+        left = record.left
+        if not left and not right:
+            continue
+
+        # Generate the tags for ways and nodes
+        name = record.name or ''
+        county = record.county or ''
+        state = record.state or ''
+        if int_ranges:
+            lfrom, lto = record.lrange or (None, None)
+            rfrom, rto = record.rrange or (None, None)
+        else:
+            lfrom, lto = record.lfromadd, record.ltoadd
+            rfrom, rto = record.rfromadd, record.rtoadd
 
-    for tags, segments in waylist.items():
-        tags = dict(tags)
         for segment in segments:
-            lsegment = []
-            rsegment = []
-            lastpoint = []
-
-            # Don't pull back the ends of very short ways too much
-            seglength = length(segment, nodelist)
-            if seglength < float(ADDRESS_PULLBACK) * 3.0:
-                pullback = seglength / 3.0
+            if engine == 'numpy':
+                lsegment, rsegment = next(offset_segments)
             else:
-                pullback = float(ADDRESS_PULLBACK)
-
-            lfromadd = tags.get("tiger:lfromadd")
-            ltoadd = tags.get("tiger:ltoadd")
-            rfromadd = tags.get("tiger:rfromadd")
-            rtoadd = tags.get("tiger:rtoadd")
-
-            right = check_if_integers([rfromadd, rtoadd])
-            left = check_if_integers([lfromadd, ltoadd])
-
-            if not left and not right:
-                continue
-
-            first = True
-            firstpointid, firstpoint = nodelist[ round_point( segment[0] ) ]
-            finalpointid, finalpoint = nodelist[ round_point( segment[len(segment) - 1] ) ]
-
-            for point in segment:
-                pointid, (lat, lon) = nodelist[ round_point( point ) ]
-
-                # The approximate number of feet in one degree of longitude
-                lrad = math.radians(lat)
-                LON_FEET = 365527.822 * math.cos(lrad) - 306.75853 * math.cos(3 * lrad) + 0.3937 * math.cos(5 * lrad)
-
-                # Calculate the points of the offset ways
-                if lastpoint:
-                    # Skip points too close to start
-                    if math.sqrt((lat * LAT_FEET - firstpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - firstpoint[1] * LON_FEET)**2) < pullback:
-                        # Preserve very short ways (but will be rendered backwards)
-                        if pointid != finalpointid:
-                            continue
-                    # Skip points too close to end
-                    if math.sqrt((lat * LAT_FEET - finalpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - finalpoint[1] * LON_FEET)**2) < pullback:
-                        # Preserve very short ways (but will be rendered backwards)
-                        if pointid not in (firstpointid, finalpointid):
-                            continue
-
-                    X = (lon - lastpoint[1]) * LON_FEET
-                    Y = (lat - lastpoint[0]) * LAT_FEET
-                    if Y != 0:
-                        theta = math.pi/2 - math.atan( X / Y)
-                        Xp = math.sin(theta) * distance
-                        Yp = math.cos(theta) * distance
-                    else:
-                        Xp = 0
-                        if X > 0:
-                            Yp = -distance
-                        else:
-                            Yp = distance
-
-                    if Y > 0:
-                        Xp = -Xp
-                    else:
-                        Yp = -Yp
-
-                    if first:
-                        first = False
-                        dX =  - (Yp * (pullback / distance)) / LON_FEET #Pull back the first point
-                        dY = (Xp * (pullback / distance)) / LAT_FEET
-                        if left:
-                            lpoint = (lastpoint[0] + (Yp / LAT_FEET) - dY, lastpoint[1] + (Xp / LON_FEET) - dX)
-                            lsegment.append( (way_id, lpoint) )
-                            way_id += 1
-                        if right:
-                            rpoint = (lastpoint[0] - (Yp / LAT_FEET) - dY, lastpoint[1] - (Xp / LON_FEET) - dX)
-                            rsegment.append( (way_id, rpoint) )
-                            way_id += 1
-
-                    else:
-                        #round the curves
-                        if delta[1] != 0:
-                            theta = abs(math.atan(delta[0] / delta[1]))
-                        else:
-                            theta = math.pi / 2
-                        if Xp != 0:
-                            theta = theta - abs(math.atan(Yp / Xp))
-                        else: theta = theta - math.pi / 2
-                        r = 1 + abs(math.tan(theta/2))
-                        if left:
-                            lpoint = (lastpoint[0] + (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] + (Xp + delta[1]) * r / (LON_FEET * 2))
-                            lsegment.append( (way_id, lpoint) )
-                            way_id += 1
-                        if right:
-                            rpoint = (lastpoint[0] - (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] - (Xp + delta[1]) * r / (LON_FEET * 2))
-                            rsegment.append( (way_id, rpoint) )
-                            way_id += 1
-
-                    delta = (Yp, Xp)
-
-                lastpoint = (lat, lon)
-
-
-            # Add in the last node
-            dX =  - (Yp * (pullback / distance)) / LON_FEET
-            dY = (Xp * (pullback / distance)) / LAT_FEET
-            if left:
-                lpoint = (lastpoint[0] + (Yp + delta[0]) / (LAT_FEET * 2) + dY, lastpoint[1] + (Xp + delta[1]) / (LON_FEET * 2) + dX )
-                lsegment.append( (way_id, lpoint) )
-                way_id += 1
-            if right:
-                rpoint = (lastpoint[0] - Yp / LAT_FEET + dY, lastpoint[1] - Xp / LON_FEET + dX)
-                rsegment.append( (way_id, rpoint) )
-                way_id += 1
-
-            # Generate the tags for ways and nodes
-            zipr = tags.get("tiger:zip_right", '')
-            zipl = tags.get("tiger:zip_left", '')
-            name = tags.get("name", '')
-            county = tags.get("tiger:county", '')
-            state = tags.get("tiger:state", '')
+                lsegment, rsegment, way_id = offset_ways(segment, nodelist, left, right, way_id, key)
 
             # Write the nodes of the offset ways
             if right:
-                interpolationtype = interpolation_type(rfromadd, rtoadd, lfromadd, ltoadd)
-
-                output.append({
-                    'from': rfromadd,
-                    'to': rtoadd,
-                    'interpolation': interpolationtype,
+                output.append(with_tlid(tlid, record, {
+                    'from': rfrom,
+                    'to': rto,
+                    'interpolation': record.rinterpolation,
                     'street': name,
                     'city': county,
                     'state': state,
-                    'postcode': zipr,
-                    'geometry': create_wkt_linestring(rsegment)
-                })
+                    'postcode': record.zip_right or '',
+                    'geometry': geometry(rsegment)
+                }))
 
             if left:
-                interpolationtype = interpolation_type(lfromadd, ltoadd, rfromadd, rtoadd)
-
-                output.append({
-                    'from': lfromadd,
-                    'to': ltoadd,
-                    'interpolation': interpolationtype,
+                output.append(with_tlid(tlid, record, {
+                    'from': lfrom,
+                    'to': lto,
+                    'interpolation': record.linterpolation,
                     'street': name,
                     'city': county,
                     'state': state,
-                    'postcode': zipl,
-                    'geometry': create_wkt_linestring(lsegment)
-                })
+                    'postcode': record.zip_left or '',
+                    'geometry': geometry(lsegment)
+                }))
 
     return output
 
+
+def with_tlid(tlid, record, row):
+    """ Adds the TLID to an output row if asked for """
+    if tlid:
+        row['tlid'] = record.tlid
+    return row
+
+def offset_ways(segment, nodelist, left, right, way_id, key=round_point):
+    """
+    Computes the points of the address ways left and/or right of segment.
+    Returns both as lists of (way_id, (lat, lon)) plus the next free way_id.
+    key: turns a point of segment into its key in nodelist
+    """
+    distance = float(ADDRESS_DISTANCE)
+    lsegment = []
+    rsegment = []
+    lastpoint = []
+
+    # Don't pull back the ends of very short ways too much
+    seglength = length(segment, nodelist, key)
+    if seglength < float(ADDRESS_PULLBACK) * 3.0:
+        pullback = seglength / 3.0
+    else:
+        pullback = float(ADDRESS_PULLBACK)
+
+    first = True
+    firstpointid, firstpoint = nodelist[ key( segment[0] ) ]
+    finalpointid, finalpoint = nodelist[ key( segment[len(segment) - 1] ) ]
+
+    for point in segment:
+        pointid, (lat, lon) = nodelist[ key( point ) ]
+
+        # The approximate number of feet in one degree of longitude
+        lrad = math.radians(lat)
+        LON_FEET = 365527.822 * math.cos(lrad) - 306.75853 * math.cos(3 * lrad) + 0.3937 * math.cos(5 * lrad)
+
+        # Calculate the points of the offset ways
+        if lastpoint:
+            # Skip points too close to start
+            if math.sqrt((lat * LAT_FEET - firstpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - firstpoint[1] * LON_FEET)**2) < pullback:
+                # Preserve very short ways (but will be rendered backwards)
+                if pointid != finalpointid:
+                    continue
+            # Skip points too close to end
+            if math.sqrt((lat * LAT_FEET - finalpoint[0] * LAT_FEET)**2 + (lon * LON_FEET - finalpoint[1] * LON_FEET)**2) < pullback:
+                # Preserve very short ways (but will be rendered backwards)
+                if pointid not in (firstpointid, finalpointid):
+                    continue
+
+            X = (lon - lastpoint[1]) * LON_FEET
+            Y = (lat - lastpoint[0]) * LAT_FEET
+            if Y != 0:
+                theta = math.pi/2 - math.atan( X / Y)
+                Xp = math.sin(theta) * distance
+                Yp = math.cos(theta) * distance
+            else:
+                Xp = 0
+                if X > 0:
+                    Yp = -distance
+                else:
+                    Yp = distance
+
+            if Y > 0:
+                Xp = -Xp
+            else:
+                Yp = -Yp
+
+            if first:
+                first = False
+                dX =  - (Yp * (pullback / distance)) / LON_FEET #Pull back the first point
+                dY = (Xp * (pullback / distance)) / LAT_FEET
+                if left:
+                    lpoint = (lastpoint[0] + (Yp / LAT_FEET) - dY, lastpoint[1] + (Xp / LON_FEET) - dX)
+                    lsegment.append( (way_id, lpoint) )
+                    way_id += 1
+                if right:
+                    rpoint = (lastpoint[0] - (Yp / LAT_FEET) - dY, lastpoint[1] - (Xp / LON_FEET) - dX)
+                    rsegment.append( (way_id, rpoint) )
+                    way_id += 1
+
+            else:
+                #round the curves
+                if delta[1] != 0:
+                    theta = abs(math.atan(delta[0] / delta[1]))
+                else:
+                    theta = math.pi / 2
+                if Xp != 0:
+                    theta = theta - abs(math.atan(Yp / Xp))
+                else: theta = theta - math.pi / 2
+                r = 1 + abs(math.tan(theta/2))
+                if left:
+                    lpoint = (lastpoint[0] + (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] + (Xp + delta[1]) * r / (LON_FEET * 2))
+                    lsegment.append( (way_id, lpoint) )
+                    way_id += 1
+                if right:
+                    rpoint = (lastpoint[0] - (Yp + delta[0]) * r / (LAT_FEET * 2), lastpoint[1] - (Xp + delta[1]) * r / (LON_FEET * 2))
+                    rsegment.append( (way_id, rpoint) )
+                    way_id += 1
+
+            delta = (Yp, Xp)
+
+        lastpoint = (lat, lon)
+
+
+    # Add in the last node
+    dX =  - (Yp * (pullback / distance)) / LON_FEET
+    dY = (Xp * (pullback / distance)) / LAT_FEET
+    if left:
+        lpoint = (lastpoint[0] + (Yp + delta[0]) / (LAT_FEET * 2) + dY, lastpoint[1] + (Xp + delta[1]) / (LON_FEET * 2) + dX )
+        lsegment.append( (way_id, lpoint) )
+        way_id += 1
+    if right:
+        rpoint = (lastpoint[0] - Yp / LAT_FEET + dY, lastpoint[1] - Xp / LON_FEET + dX)
+        rsegment.append( (way_id, rpoint) )
+        way_id += 1
+
+    return lsegment, rsegment, way_id
+
+
+def segments_arrays(segments, nodelist):
+    """
+    Returns the ids, latitudes and longitudes of the nodes of all segments
+    as arrays, plus the offsets of each segment in them.
+    """
+    offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum([len(segment) for segment in segments], out=offsets[1:])
+    if isinstance(nodelist, NodeStore):
+        return nodelist.segments_arrays(segments) + (offsets,)
+
+    nodes = [nodelist[ round_point( point ) ] for segment in segments for point in segment]
+    ids = np.array([node[0] for node in nodes], dtype=np.int64)
+    coords = np.array([node[1] for node in nodes], dtype=np.float64).reshape(-1, 2)
+    return ids, coords[:, 0], coords[:, 1], offsets
+
+def numpy_address_segments(waylist, nodelist, way_id):
+    """
+    The address ways of all segments that addressways converts, computed
+    with lib.offset.offset_ways in one go. Returns the list of (lsegment,
+    rsegment) in the order of the waylist and the next free way_id.
+    """
+    segments = []
+    left = []
+    right = []
+    for record, chains in waylist.items():
+        if record.left or record.right:
+            for segment in chains:
+                segments.append(segment)
+                left.append(record.left)
+                right.append(record.right)
+
+    ids, lats, lons, offsets = segments_arrays(segments, nodelist)
+    lcoords, loffsets, rcoords, roffsets = numpy_offset_ways(ids, lats, lons, offsets, left, right,
+                                                             ADDRESS_DISTANCE, ADDRESS_PULLBACK)
+    lpoints = list(map(tuple, lcoords.tolist()))
+    rpoints = list(map(tuple, rcoords.tolist()))
+    loffsets = loffsets.tolist()
+    roffsets = roffsets.tolist()
+
+    offset_segments = []
+    for i in range(len(segments)):
+        lsegment = list(enumerate(lpoints[loffsets[i]:loffsets[i + 1]], way_id))
+        way_id += len(lsegment)
+        rsegment = list(enumerate(rpoints[roffsets[i]:roffsets[i + 1]], way_id))
+        way_id += len(rsegment)
+        offset_segments.append((lsegment, rsegment))
+    return offset_segments, way_id
+
 def compile_nodelist(parsed_gisdata):
-    nodelist = {}
+    points = {}
 
-    i = 1
     for geom, _tags in parsed_gisdata:
         for point in geom:
             r_point = round_point(point)
-            if r_point not in nodelist:
-                nodelist[r_point] = (i, unproject(point))
-                i += 1
+            if r_point not in points:
+                points[r_point] = point
 
-    return (i, nodelist)
+    # Unproject all nodes in one go
+    projected = unproject_points(list(points.values())).tolist()
 
+    nodelist = {}
+    i = 1
+    for r_point, coords in zip(points, projected):
+        nodelist[r_point] = (i, tuple(coords))
+        i += 1
 
+    return (i, nodelist)
 
-def compile_waylist(parsed_gisdata):
-    waylist = {}
 
-    # Group by tiger:way_id
-    for geom, tags in parsed_gisdata:
-        way_key = tags.copy()
-        # {'tiger:way_id': 18403490, 'name': 'Holly St', 'tiger:county': 'Perquimans', 'tiger:state': 'NC'}
-        way_key = ( way_key['tiger:way_id'], tuple( [(k,v) for k,v in way_key.items()] ) )
-        # (18403490, (('tiger:way_id', 18403490), ('name', 'Holly St'), ('tiger:county', 'Perquimans'), ('tiger:state', 'NC')))
 
-        if way_key not in waylist:
-            waylist[way_key] = []
+def compile_waylist(parsed_gisdata, key=round_point, non_integer=None):
+    """
+    Groups the segments by their tags, glued into chains. Returns a dict
+    AddressRecord => list of chains, in the order the tags first appear.
+    non_integer: Counter of the non integer address range values
+    """
+    groups = []
+    groups_by_tlid = {}
 
-        waylist[way_key].append(geom)
+    # Group by tiger:way_id, then by the other tags. A TLID almost always
+    # has the same tags on all its features, so they only get compared
+    # within the (usually single) groups of the same TLID.
+    for geom, tags in parsed_gisdata:
+        tlid_groups = groups_by_tlid.get(tags['tiger:way_id'])
+        if tlid_groups is None:
+            tlid_groups = groups_by_tlid[tags['tiger:way_id']] = []
+
+        for group_tags, segments in tlid_groups:
+            if group_tags == tags:
+                segments.append(geom)
+                break
+        else:
+            group = (tags, [geom])
+            tlid_groups.append(group)
+            groups.append(group)
 
     ret = {}
-    for (_way_id, way_key), segments in waylist.items():
-        ret[way_key] = glom_all( segments )
+    for tags, segments in groups:
+        ret[AddressRecord(tags, non_integer)] = glom_all( segments, key )
     return ret
+
+
+def compile_nodestore_and_waylist(coords, offsets, tags, non_integer=None):
+    """
+    Array based version of compile_nodelist + compile_waylist. Takes the
+    points of all features as one (n, 2) array, offsets[i]:offsets[i + 1]
+    being the points of the feature with tags[i]. Returns a NodeStore and
+    a waylist whose segments are made of node indices.
+    """
+    nodestore, node_indices = compile_nodestore(coords)
+    segments = np.split(node_indices, np.asarray(offsets)[1:-1])
+
+    return nodestore, compile_waylist(zip(segments, tags), node_index, non_integer)
+
+
+def stream_addressways(parsed_gisdata, first_way_id=1, engine='scalar', tlid=False,
+                       geometry=create_wkt_linestring, non_integer=None, int_ranges=False):
+    """
+    Streaming version of compile_nodelist + compile_waylist + addressways.
+    Consecutive features with the same tiger:way_id get converted together
+    and their address ways yielded right away, so only one way is kept in
+    memory at a time. TIGER EDGES files list every TLID once, if a way
+    shows up again later it gets converted separately.
+    """
+    seen_way_ids = set()
+    way_id = first_way_id
+
+    for tiger_way_id, features in groupby(parsed_gisdata, key=lambda feature: feature[1]['tiger:way_id']):
+        if tiger_way_id in seen_way_ids:
+            print("tiger:way_id %s is not consecutive, converting it in parts" % tiger_way_id)
+        seen_way_ids.add(tiger_way_id)
+
+        features = list(features)
+        node_count, nodelist = compile_nodelist(features)
+        waylist = compile_waylist(features, non_integer=non_integer)
+
+        yield from addressways(waylist, nodelist, way_id, engine, tlid, geometry, int_ranges)
+        way_id += node_count
+
+
+def shape_to_csv(shp_filename, csv_filename, streaming=False, address_only=True, batched=False,
+                 engine='scalar', nodestore=False, tlid=False, compression=None, output_format='csv',
+                 instrumentation=None, cache_dir=None):
+    """
+    Main feature: reads a file, writes a file
+    address_only: skip edges without address ranges while reading. They
+    never produce address ways, so the output is the same either way.
+    batched: use the columnar batch reader
+    engine: how addressways computes the geometries, 'scalar' or 'numpy'
+    nodestore: keep the nodes in a NodeStore instead of a nodelist dict
+    tlid: add the TLID of each edge as first column
+    compression: None, 'gzip' or 'zstd' (see lib.output)
+    output_format: 'csv', 'pgcopy' (PostgreSQL binary COPY) or 'parquet' (GeoParquet)
+    instrumentation: a lib.instrument.Instrumentation to record the stages in
+    cache_dir: load the compiled nodes and waylist from there (see
+    lib.cache) instead of parsing the file, or save them there. Implies
+    nodestore, ignored when streaming.
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    fieldnames = TLID_CSV_FIELDNAMES if tlid else CSV_FIELDNAMES
+    write_output, geometry, int_ranges = OUTPUT_FORMATS[output_format]
+    non_integer = Counter()
+
+    if streaming:
+        print("streaming shpfile %s into %s" % (shp_filename, csv_filename))
+        with instrumentation.stage('stream') as counts:
+            parsed_features = iter_shp_for_geom_and_tags(shp_filename, address_only, TAG_FIELDS, batched)
+            parsed_features = counted(parsed_features, counts, 'features')
+            csv_lines = counted(stream_addressways(parsed_features, engine=engine, tlid=tlid, geometry=geometry,
+                                                   non_integer=non_integer, int_ranges=int_ranges),
+                                counts, 'rows')
+            write_output(csv_filename, csv_lines, fieldnames, compression)
+            report_non_integer(non_integer, counts)
+        return
+
+    cache = cache_path(cache_dir, shp_filename, address_only) if cache_dir else None
+    nodestore = nodestore or cache is not None
+    # no reference to the parsed data here, compile_addressways frees it early
+    csv_lines = compile_addressways(read_shape(shp_filename, address_only, batched, nodestore, instrumentation, cache),
+                                    nodestore, engine, tlid, output_format, instrumentation, cache)
+    write_addressways(csv_filename, csv_lines, tlid, compression, output_format, instrumentation)
+
+
+def read_shape(shp_filename, address_only=True, batched=False, nodestore=False, instrumentation=None,
+               cache=None):
+    """
+    The parse stage of shape_to_csv: the features of the file, or with
+    nodestore its points, offsets and tags as arrays. If the cache
+    directory (see lib.cache.cache_path) exists, the CachedCounty in it
+    instead.
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+
+    if cache is not None:
+        with instrumentation.stage('load_cache') as counts:
+            non_integer = Counter()
+            cached = load_cache(cache, non_integer)
+            if cached is not None:
+                print("loading %s from the cache" % shp_filename)
+                counts.update(nodes=len(cached[0]), ways=len(cached[1]), chains=chain_count(cached[1]))
+                report_non_integer(non_integer, counts)
+                return CachedCounty(*cached)
+
+    with instrumentation.stage('parse') as counts:
+        print("parsing shpfile %s" % shp_filename)
+        if nodestore:
+            parsed = parse_shp_for_coords_and_tags(shp_filename, address_only, batched)
+            counts['features'] = len(parsed[2])
+        else:
+            parsed = parse_shp_for_geom_and_tags(shp_filename, address_only, TAG_FIELDS, batched)
+            counts['features'] = len(parsed)
+    return parsed
+
+
+def compile_addressways(parsed, nodestore=False, engine='scalar', tlid=False, output_format='csv',
+                        instrumentation=None, cache=None):
+    """
+    The CPU bound stages of shape_to_csv: turns what read_shape returned
+    into the rows of the address ways. With nodestore, the compiled nodes
+    and waylist get saved to the cache directory if given.
+    """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    _write_output, geometry, int_ranges = OUTPUT_FORMATS[output_format]
+    non_integer = Counter()
+
+    if isinstance(parsed, CachedCounty):
+        nodes, waylist = parsed.nodestore, parsed.waylist
+        del parsed
+        first_way_id = len(nodes) + 1
+    elif nodestore:
+        with instrumentation.stage('compile_nodestore') as counts:
+            print("compiling nodestore and waylist")
+            coords, offsets, tags = parsed
+            del parsed
+            nodes, waylist = compile_nodestore_and_waylist(coords, offsets, tags, non_integer)
+            del coords, offsets, tags
+            counts.update(nodes=len(nodes), ways=len(waylist), chains=chain_count(waylist))
+            report_non_integer(non_integer, counts)
+
+        if cache is not None:
+            with instrumentation.stage('save_cache'):
+                print("saving to the cache")
+                save_cache(cache, nodes, waylist)
+
+        first_way_id = len(nodes) + 1
+    else:
+        with instrumentation.stage('compile_nodelist') as counts:
+            print("compiling nodelist")
+            first_way_id, nodes = compile_nodelist(parsed)
+            counts['nodes'] = len(nodes)
+
+        with instrumentation.stage('compile_waylist') as counts:
+            print("compiling waylist")
+            waylist = compile_waylist(parsed, non_integer=non_integer)
+            counts.update(ways=len(waylist), chains=chain_count(waylist))
+            report_non_integer(non_integer, counts)
+
+    with instrumentation.stage('addressways') as counts:
+        print("preparing address ways")
+        csv_lines = addressways(waylist, nodes, first_way_id, engine, tlid, geometry, int_ranges)
+        counts['rows'] = len(csv_lines)
+    return csv_lines
+
+
+class CachedCounty:
+    """ NodeStore and waylist of a county loaded by lib.cache.load_cache """
+    __slots__ = ('nodestore', 'waylist')
+
+    def __init__(self, nodestore, waylist):
+        self.nodestore = nodestore
+        self.waylist = waylist
+
+
+def write_addressways(csv_filename, csv_lines, tlid=False, compression=None, output_format='csv',
+                      instrumentation=None):
+    """ The write stage of shape_to_csv """
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    fieldnames = TLID_CSV_FIELDNAMES if tlid else CSV_FIELDNAMES
+
+    with instrumentation.stage('write') as counts:
+        print("writing %s" % csv_filename)
+        counts['rows'] = OUTPUT_FORMATS[output_format][0](csv_filename, csv_lines, fieldnames, compression)
+
+
+def report_non_integer(non_integer, counts):
+    """ Prints the summary of the non integer address range values and counts them """
+    summary = non_integer_summary(non_integer)
+    if summary:
+        print(summary)
+        counts['non_integer'] = sum(non_integer.values())
+
+
+def chain_count(waylist):
+    """ Number of glued segments in a waylist """
+    return sum(len(segments) for segments in waylist.values())
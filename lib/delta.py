@@ -0,0 +1,120 @@
+"""
+Year-over-year delta of two conversions made with --tlid: the rows of the
+TLIDs that were added, removed or changed. Both datasets are first split
+into buckets on disk by a hash of the TLID, then one bucket pair at a time
+is loaded, sorted by TLID and compared. Only one bucket of each year is in
+memory at any time. The delta is ordered by bucket, then TLID.
+"""
+
+import os
+import zlib
+
+from .output import csv_filenames, open_csv
+
+BUCKETS = 256
+
+DELTA_HEADER = 'action;tlid;from;to;interpolation;street;city;state;postcode;geometry'
+
+
+def input_filenames(path):
+    """ A single file, or all county CSV files (also compressed ones) of a directory """
+    if os.path.isdir(path):
+        return csv_filenames(path)
+    return [path]
+
+
+def bucket_of(tlid, buckets):
+    return zlib.crc32(tlid.encode('ascii')) % buckets
+
+
+def split_into_buckets(path, bucket_dir, buckets=BUCKETS):
+    """
+    Writes each row of the CSV files in path (without the header lines)
+    to bucket_dir/<bucket>.csv, one row per line. Returns the number of
+    rows.
+    """
+    os.makedirs(bucket_dir, exist_ok=True)
+    bucket_files = [open(os.path.join(bucket_dir, '%d.csv' % bucket), 'w', encoding='utf8')
+                    for bucket in range(buckets)]
+    rows = 0
+    try:
+        for filename in input_filenames(path):
+            with open_csv(filename) as file:
+                header = file.readline()
+                if not header.startswith('tlid;'):
+                    raise ValueError("%s has no tlid column, convert with --tlid" % filename)
+                for line in file:
+                    line = line.rstrip('\r\n')
+                    if not line or line.startswith('tlid;'):
+                        continue
+                    tlid = line[:line.index(';')]
+                    bucket_files[bucket_of(tlid, buckets)].write(line + '\n')
+                    rows += 1
+    finally:
+        for bucket_file in bucket_files:
+            bucket_file.close()
+    return rows
+
+
+def read_bucket(filename):
+    """ dict TLID => sorted list of its rows """
+    rows = {}
+    with open(filename, encoding='utf8', newline='') as file:
+        for line in file:
+            line = line[:-1]
+            rows.setdefault(int(line[:line.index(';')]), []).append(line)
+    for tlid_rows in rows.values():
+        tlid_rows.sort()
+    return rows
+
+
+def compare_buckets(old_rows, new_rows, counts):
+    """
+    Yields (action, row) sorted by TLID: the old rows of removed TLIDs,
+    the new rows of added and changed TLIDs. Counts the TLIDs per action
+    in counts.
+    """
+    for tlid in sorted(old_rows.keys() | new_rows.keys()):
+        old = old_rows.get(tlid)
+        new = new_rows.get(tlid)
+        if old == new:
+            counts['unchanged'] += 1
+            continue
+        if new is None:
+            action, rows = 'removed', old
+        elif old is None:
+            action, rows = 'added', new
+        else:
+            action, rows = 'changed', new
+        counts[action] += 1
+        for row in rows:
+            yield action, row
+
+
+def write_delta(old_path, new_path, delta_filename, tmpdir, buckets=BUCKETS):
+    """
+    Writes the delta between the CSV files (or directories) old_path and
+    new_path to delta_filename, using tmpdir for the buckets. Every row
+    starts with the action: 'removed' rows are the old rows of TLIDs that
+    are gone, 'added' and 'changed' rows are all new rows of those TLIDs
+    (an importer deletes the old rows of changed TLIDs first).
+    Returns the number of TLIDs per action.
+    """
+    old_dir = os.path.join(tmpdir, 'old')
+    new_dir = os.path.join(tmpdir, 'new')
+    split_into_buckets(old_path, old_dir, buckets)
+    split_into_buckets(new_path, new_dir, buckets)
+
+    counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+    with open(delta_filename, 'w', encoding='utf8') as delta_file:
+        delta_file.write(DELTA_HEADER + '\n')
+        for bucket in range(buckets):
+            old_filename = os.path.join(old_dir, '%d.csv' % bucket)
+            new_filename = os.path.join(new_dir, '%d.csv' % bucket)
+            for action, row in compare_buckets(read_bucket(old_filename), read_bucket(new_filename), counts):
+                delta_file.write(action + ';' + row + '\n')
+
+            os.remove(old_filename)
+            os.remove(new_filename)
+
+    return counts
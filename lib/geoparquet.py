@@ -0,0 +1,68 @@
+"""
+Writes address ways as GeoParquet file: integer from/to (and tlid),
+text attributes and the geometry as WKB in longitude/latitude.
+Needs the pyarrow package.
+"""
+
+import json
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows per row group, also the number of rows kept in memory while writing
+ROW_GROUP_SIZE = 65536
+
+INTEGER_COLUMNS = ('tlid', 'from', 'to')
+
+GEO_METADATA = {
+    'version': '1.0.0',
+    'primary_column': 'geometry',
+    'columns': {
+        'geometry': {
+            # no 'crs' means OGC:CRS84, i.e. WGS84 longitude/latitude
+            'encoding': 'WKB',
+            'geometry_types': ['LineString']
+        }
+    }
+}
+
+
+def parquet_schema(fieldnames):
+    fields = []
+    for column in fieldnames:
+        if column in INTEGER_COLUMNS:
+            fields.append(pyarrow.field(column, pyarrow.int64()))
+        elif column == 'geometry':
+            fields.append(pyarrow.field(column, pyarrow.binary()))
+        else:
+            fields.append(pyarrow.field(column, pyarrow.string()))
+    return pyarrow.schema(fields, metadata={b'geo': json.dumps(GEO_METADATA).encode('utf8')})
+
+
+def write_geoparquet(filename, rows, fieldnames, compression=None):
+    """
+    Writes the dicts rows (with WKB geometry, see
+    lib.helpers.create_wkb_linestring, and ints in INTEGER_COLUMNS) as
+    GeoParquet file. compression is the Parquet column compression
+    ('gzip', 'zstd', default snappy). Returns the number of rows.
+    """
+    if pyarrow is None:
+        raise ImportError("GeoParquet output needs the pyarrow package (pip install pyarrow)")
+
+    schema = parquet_schema(fieldnames)
+    count = 0
+    with pyarrow.parquet.ParquetWriter(filename, schema, compression=compression or 'snappy') as writer:
+        columns = {column: [] for column in fieldnames}
+        for row in rows:
+            for column in fieldnames:
+                columns[column].append(row.get(column))
+            count += 1
+            if count % ROW_GROUP_SIZE == 0:
+                writer.write_table(pyarrow.table(columns, schema=schema))
+                columns = {column: [] for column in fieldnames}
+        if columns[fieldnames[0]] or not count:
+            writer.write_table(pyarrow.table(columns, schema=schema))
+    return count
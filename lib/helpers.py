@@ -1,4 +1,10 @@
+import hashlib
 import math
+import os
+import struct
+from array import array
+from collections import deque
+from functools import lru_cache
 
 def round_point( point, accuracy=8 ):
     """
@@ -80,28 +86,110 @@ def glom_once( segments ):
 
     return x, unsorted
 
-def glom_all( segments ):
+def glom_all( segments, key=round_point ):
     """
     Takes a list of segments and combines as many as possible together. Returns
     a list of (now combined) segments.
+
+    Gives the same result as calling glom_once until no segments are left,
+    but looks up adjacent segments in an index of their end points (as
+    returned by key) instead of comparing against all remaining segments.
     """
-    unsorted = segments
+    segments = list( segments )
+    ends = [ (key(segment[0]), key(segment[-1])) for segment in segments ]
+
+    # end point => numbers of the segments ending there, in ascending order
+    index = {}
+    for i, (first, last) in enumerate( ends ):
+        index.setdefault( first, deque() ).append( i )
+        if last != first:
+            index.setdefault( last, deque() ).append( i )
+
+    used = [False] * len( segments )
+
+    def next_unused( end ):
+        # Smallest segment number at end that has not been glommed yet
+        candidates = index[end]
+        while candidates and used[candidates[0]]:
+            candidates.popleft()
+        return candidates[0] if candidates else len( segments )
+
     chunks = []
+    for start, segment in enumerate( segments ):
+        if used[start]:
+            continue
+        used[start] = True
 
-    while unsorted != []:
-        chunk, unsorted = glom_once( unsorted )
-        chunks.append( chunk )
+        # Once something gets glommed, the chunk is chain, or chain reversed
+        # if is_reversed is set, so it can be reversed and extended on both
+        # ends without copying.
+        chain = None
+        is_reversed = False
+        first, last = ends[start]
+
+        while True:
+            i = min( next_unused( first ), next_unused( last ) )
+            if i == len( segments ):
+                break
+            used[i] = True
+            other = segments[i]
+            other_first, other_last = ends[i]
+            if chain is None:
+                chain = deque( segment )
+
+            # Same cases as in glom(), which keeps the shared point of the
+            # segment appended
+            if first == other_first:
+                # reverse chunk, drop its first point, append other
+                if is_reversed:
+                    chain.pop()
+                else:
+                    chain.popleft()
+                is_reversed = not is_reversed
+                first, last = last, other_last
+            elif first == other_last:
+                # prepend other without its last point
+                if is_reversed:
+                    chain.extend( reversed( other[:-1] ) )
+                else:
+                    chain.extendleft( reversed( other[:-1] ) )
+                first = other_first
+                continue
+            else:
+                # drop last point of chunk, append other (reversed if needed)
+                if is_reversed:
+                    chain.popleft()
+                else:
+                    chain.pop()
+                if last == other_first:
+                    last = other_last
+                else:
+                    other = list( reversed( other ) )
+                    last = other_first
+
+            if is_reversed:
+                chain.extendleft( other )
+            else:
+                chain.extend( other )
+
+        if chain is None:
+            # Nothing glommed, keep the segment as it was (like glom_once)
+            chunks.append( segment )
+            continue
+        if is_reversed:
+            chain.reverse()
+        chunks.append( list( chain ) )
 
     return chunks
 
 
-def length(segment, nodelist):
+def length(segment, nodelist, key=round_point):
     '''Returns the length (in feet) of a segment'''
     first = True
     distance = 0
     lat_feet = 364613  # The approximate number of feet in one degree of latitude
     for point in segment:
-        _pointid, (lat, lon) = nodelist[ round_point( point ) ]
+        _pointid, (lat, lon) = nodelist[ key( point ) ]
         if first:
             first = False
         else:
@@ -152,11 +240,59 @@ def interpolation_type(this_from, this_to, other_from, other_to):
 
     return "all"
 
+@lru_cache(maxsize=1024)
+def wkt_linestring_format(count):
+    """ Format string of a LINESTRING() with count vertices """
+    return 'LINESTRING(' + ','.join(['%f %f'] * count) + ')'
+
 def create_wkt_linestring(segment):
     """
-    Create well known text LINESTRING()
+    Create well known text LINESTRING(), formatting all coordinates with
+    one % operation
     """
-    coord_pairs = []
+    coords = []
+    for _i, (lat, lon) in segment:
+        coords.append(lon)
+        coords.append(lat)
+    return wkt_linestring_format(len(segment)) % tuple(coords)
+
+
+# WKB geometry type and the EWKB flag for an included SRID
+WKB_LINESTRING = 2
+EWKB_SRID_FLAG = 0x20000000
+
+def create_wkb_linestring(segment, srid=None):
+    """
+    Create little endian well known binary LINESTRING, EWKB with SRID if
+    given. Coordinates are rounded to 6 decimals like in the WKT.
+    """
+    coords = array('d')
     for _i, point in segment:
-        coord_pairs.append( "%f %f" % (point[1], point[0]) )
-    return 'LINESTRING(' + ','.join(coord_pairs) + ')'
+        coords.append(round(point[1], 6))
+        coords.append(round(point[0], 6))
+    if array('d', [1.0]).tobytes() != struct.pack('<d', 1.0):
+        coords.byteswap()
+
+    if srid is None:
+        header = struct.pack('<BII', 1, WKB_LINESTRING, len(segment))
+    else:
+        header = struct.pack('<BIII', 1, WKB_LINESTRING | EWKB_SRID_FLAG, srid, len(segment))
+    return header + coords.tobytes()
+
+
+def files_sha256(filenames):
+    """ Hex SHA-256 of the names and contents of files, in the order given """
+    sha256 = hashlib.sha256()
+    for filename in filenames:
+        sha256.update(os.path.basename(filename).encode('utf8'))
+        sha256.update(bytes.fromhex(file_sha256(filename)))
+    return sha256.hexdigest()
+
+
+def file_sha256(filename):
+    """ Hex SHA-256 of a file's contents """
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
@@ -0,0 +1,163 @@
+"""
+Per stage timing and memory figures of a conversion, written as one JSON
+line per county, and the roll up over a whole run
+"""
+
+import json
+import resource
+import time
+from contextlib import contextmanager
+
+
+def _status_kb(field):
+    """ A memory figure of /proc/self/status in kB, None if not on Linux """
+    try:
+        with open('/proc/self/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of this process to the current one
+    (Linux >= 4.0). Returns False if that isn't possible.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return _status_kb('VmHWM') is not None
+
+
+def current_rss_kb():
+    """ Resident set size of this process now, in kB, None if unknown """
+    return _status_kb('VmRSS')
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in kB, since the last
+    reset_peak_rss() (on Linux), otherwise over the whole process life
+    """
+    peak = _status_kb('VmHWM')
+    if peak is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+def counted(iterable, counts, name):
+    """ Passes the items through, counting them in counts[name] """
+    counts.setdefault(name, 0)
+    for item in iterable:
+        counts[name] += 1
+        yield item
+
+
+class Instrumentation:
+    """
+    Records wall time, CPU time, peak RSS and item counts for each stage of
+    one conversion. info (e.g. county=..., input=...) goes into the record.
+
+    The peak RSS of a stage is measured from its start: the peak of the
+    process gets reset when a stage starts, so counties converted earlier
+    in the same worker process don't show up. Where it can't be reset, the
+    larger of the RSS at start and end of the stage is recorded.
+    With reset_peak=False, for stages running at the same time as stages
+    of other conversions in the same process (the pipelined batch
+    converter), the peak isn't reset, as that would lose the peak of the
+    other stages. The process wide peak so far gets recorded instead, an
+    upper bound that also includes the counties of the process before.
+
+        with instrumentation.stage('parse') as counts:
+            parsed = parse(...)
+            counts['features'] = len(parsed)
+    """
+
+    def __init__(self, reset_peak=True, **info):
+        self.info = info
+        self.reset_peak = reset_peak
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        counts = {}
+        resettable = self.reset_peak and reset_peak_rss()
+        start_rss = current_rss_kb() if self.reset_peak else None
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield counts
+        finally:
+            if resettable:
+                peak = peak_rss_kb()
+            elif start_rss is not None:
+                peak = max(start_rss, current_rss_kb())
+            else:
+                peak = peak_rss_kb()
+            self.stages.append({
+                'stage': name,
+                'wall': round(time.perf_counter() - wall, 6),
+                'cpu': round(time.thread_time() - cpu, 6),
+                'peak_rss_kb': peak,
+                'counts': counts
+            })
+
+    def record(self):
+        """ The JSON-able report of the conversion """
+        record = dict(self.info)
+        record['wall'] = round(sum(stage['wall'] for stage in self.stages), 6)
+        record['cpu'] = round(sum(stage['cpu'] for stage in self.stages), 6)
+        record['peak_rss_kb'] = max((stage['peak_rss_kb'] for stage in self.stages), default=0)
+        record['stages'] = self.stages
+        return record
+
+
+def append_report(filename, record):
+    with open(filename, 'a', encoding='utf8') as file:
+        file.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def read_report(filename):
+    with open(filename, encoding='utf8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def summarize(records, top=10):
+    """
+    Roll up of the records of many counties: totals per stage with the
+    county where the stage took longest, and the slowest counties with
+    their slowest stage. Returns a list of lines.
+    """
+    stages = {}
+    for record in records:
+        for stage in record['stages']:
+            total = stages.setdefault(stage['stage'], {'wall': 0.0, 'cpu': 0.0, 'peak_rss_kb': 0,
+                                                       'worst': None})
+            total['wall'] += stage['wall']
+            total['cpu'] += stage['cpu']
+            total['peak_rss_kb'] = max(total['peak_rss_kb'], stage['peak_rss_kb'])
+            if total['worst'] is None or stage['wall'] > total['worst'][1]:
+                total['worst'] = (record.get('county'), stage['wall'])
+
+    lines = ["%-20s %10s %10s %12s  %s" % ('stage', 'wall', 'cpu', 'peak rss', 'slowest county')]
+    for name, total in sorted(stages.items(), key=lambda item: -item[1]['wall']):
+        lines.append("%-20s %9.1fs %9.1fs %9d MB  %s (%.1fs)" % (
+            name, total['wall'], total['cpu'], total['peak_rss_kb'] // 1024,
+            total['worst'][0], total['worst'][1]))
+
+    lines.append("")
+    lines.append("%-20s %10s %10s %12s  %s" % ('county', 'wall', 'cpu', 'peak rss', 'slowest stage'))
+    for record in sorted(records, key=lambda record: -record['wall'])[:top]:
+        if not record['stages']:
+            continue
+        slowest = max(record['stages'], key=lambda stage: stage['wall'])
+        lines.append("%-20s %9.1fs %9.1fs %9d MB  %s (%.1fs)" % (
+            record.get('county'), record['wall'], record['cpu'], record['peak_rss_kb'] // 1024,
+            slowest['stage'], slowest['wall']))
+
+    return lines
@@ -0,0 +1,112 @@
+"""
+Manifest of the converted counties: records what each output file was
+created from, so a later run can skip counties that would come out the same
+"""
+
+import glob
+import json
+import os
+
+from .convert import ADDRESS_DISTANCE, ADDRESS_PULLBACK
+from .helpers import file_sha256, files_sha256
+
+MANIFEST_FILENAME = 'manifest.jsonl'
+
+# Data files the conversion reads, relative to the lib package
+DATA_FILES = ('../tiger_county_fips.json',)
+
+# The options of shape_to_csv that change the output and their defaults.
+# The others (streaming, batched, nodestore, ...) only change how it gets
+# computed. The engines agree within 1e-6 degrees, which can still show
+# in the rounded coordinates.
+OUTPUT_OPTIONS = {
+    'tlid': False,
+    'compression': None,
+    'output_format': 'csv',
+    'engine': 'scalar'
+}
+
+
+def converter_version():
+    """
+    Hash over the sources of the lib package and the data files it reads.
+    Any change counts as a new version and causes all counties to be
+    converted again.
+    """
+    directory = os.path.dirname(__file__)
+    return files_sha256(sorted(glob.glob(os.path.join(directory, '*.py')))
+                        + [os.path.join(directory, data_file) for data_file in DATA_FILES])[:16]
+
+
+def conversion_parameters(options):
+    """ Everything besides the input file that the output depends on """
+    parameters = {
+        'ADDRESS_DISTANCE': ADDRESS_DISTANCE,
+        'ADDRESS_PULLBACK': ADDRESS_PULLBACK
+    }
+    parameters.update({option: options.get(option, default) for option, default in OUTPUT_OPTIONS.items()})
+    return parameters
+
+
+def manifest_entry(countyid, input_filename, output_filename, version, parameters):
+    """ Describes one converted county, the output file must exist """
+    return {
+        'county': countyid,
+        'input': os.path.basename(input_filename),
+        'input_size': os.path.getsize(input_filename),
+        'input_sha256': file_sha256(input_filename),
+        'converter_version': version,
+        'parameters': parameters,
+        'output': os.path.basename(output_filename),
+        'output_size': os.path.getsize(output_filename),
+        'output_sha256': file_sha256(output_filename)
+    }
+
+
+def is_up_to_date(entry, input_filename, output_filename, version, parameters):
+    """
+    True if the manifest entry was created from the same input file with the
+    same converter version and parameters, and the output file is still the
+    one written back then.
+    """
+    if entry is None or not os.path.exists(output_filename):
+        return False
+
+    return entry['input'] == os.path.basename(input_filename) \
+        and entry['input_size'] == os.path.getsize(input_filename) \
+        and entry['converter_version'] == version \
+        and entry['parameters'] == parameters \
+        and entry['output_size'] == os.path.getsize(output_filename) \
+        and entry['input_sha256'] == file_sha256(input_filename) \
+        and entry['output_sha256'] == file_sha256(output_filename)
+
+
+def read_manifest(outpath):
+    """ Returns a dict countyid => latest manifest entry """
+    manifest = {}
+    filename = os.path.join(outpath, MANIFEST_FILENAME)
+    if os.path.exists(filename):
+        with open(filename, encoding='utf8') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    manifest[entry['county']] = entry
+    return manifest
+
+
+def append_manifest(outpath, entry):
+    """
+    Adds an entry right after a county is done, so an interrupted run
+    keeps what it finished.
+    """
+    with open(os.path.join(outpath, MANIFEST_FILENAME), 'a', encoding='utf8') as file:
+        file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+
+def write_manifest(outpath, manifest):
+    """ Rewrites the manifest with only the latest entry of each county """
+    filename = os.path.join(outpath, MANIFEST_FILENAME)
+    with open(filename + '.tmp', 'w', encoding='utf8') as file:
+        for countyid in sorted(manifest):
+            file.write(json.dumps(manifest[countyid], sort_keys=True) + '\n')
+    os.replace(filename + '.tmp', filename)
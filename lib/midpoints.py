@@ -0,0 +1,132 @@
+"""
+Fast reader for the middle points of the geometries of a CSV file created
+by the converter. Instead of parsing every row and every coordinate, it
+finds the delimiters of the memory-mapped file with numpy and only parses
+the middle vertex of each line.
+"""
+
+import mmap
+import logging
+
+import numpy as np
+
+LOG = logging.getLogger()
+
+LINESTRING_PREFIX = b'LINESTRING('
+
+# Longest number of a middle vertex that gets parsed, longer ones fall back
+NUMBER_WIDTH = 32
+
+
+def _gather(data, starts, ends):
+    """ The bytes data[start:end] of each range, as a numpy bytes array """
+    width = max(int(np.max(ends - starts, initial=0)), 1)
+    index = starts[:, None] + np.arange(width)
+    chars = data[np.minimum(index, len(data) - 1)]
+    chars[index >= ends[:, None]] = 0
+    return np.ascontiguousarray(chars).view('S%d' % width).ravel()
+
+
+def read_midpoints_mmap(filename):
+    """
+    Same as lib.postcodes.read_midpoints() for one CSV file, as dict of
+    (n, 2) arrays of [lon, lat]. Returns None for files it can't read
+    this way (quoted fields, lines with a different number of columns,
+    very long numbers), those should be read with the csv module.
+    """
+    with open(filename, 'rb') as file:
+        if not file.seek(0, 2):
+            return {}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                return _read_midpoints(data)
+            finally:
+                del data
+
+
+def _read_midpoints(data):
+    if np.any(data == ord('"')):
+        return None
+
+    # Lines, without the line terminator
+    newlines = np.flatnonzero(data == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    if starts[-1] == len(data):
+        starts, ends = starts[:-1], ends[:-1]
+    has_cr = ends > starts
+    has_cr[has_cr] = data[ends[has_cr] - 1] == ord('\r')
+    ends = ends - has_cr
+
+    header = bytes(data[starts[0]:ends[0]]).decode('utf8').split(';')
+    if 'postcode' not in header or 'geometry' not in header:
+        return None
+    postcode_column = header.index('postcode')
+    geometry_column = header.index('geometry')
+    starts, ends = starts[1:], ends[1:]
+
+    # csv skips empty lines
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+
+    # Fields: the n-th semicolon of a line ends its n-th field
+    semicolons = np.flatnonzero(data == ord(';'))
+    first_semicolon = np.searchsorted(semicolons, starts)
+    if np.any(np.searchsorted(semicolons, ends) - first_semicolon != len(header) - 1):
+        return None
+    semicolons = np.concatenate((semicolons, [len(data)]))
+
+    def field(column):
+        field_starts = starts if column == 0 else semicolons[first_semicolon + column - 1] + 1
+        field_ends = ends if column == len(header) - 1 else semicolons[first_semicolon + column]
+        return field_starts, field_ends
+
+    # Only lines with five digit postcodes (which also skips repeated headers)
+    postcode_starts, postcode_ends = field(postcode_column)
+    valid = postcode_ends - postcode_starts == 5
+    digits = data[np.minimum(postcode_starts[valid, None] + np.arange(5), len(data) - 1)]
+    valid[valid] = np.all((digits >= ord('0')) & (digits <= ord('9')), axis=1)
+
+    postcodes = _gather(data, postcode_starts[valid], postcode_ends[valid])
+    geometry_starts, geometry_ends = (array[valid] for array in field(geometry_column))
+    LOG.warning("%s lines read.", len(postcodes))
+    if not len(postcodes):
+        return {}
+
+    # Fail if geometry can't be parsed. Shouldn't happen because it's one of
+    # our scripts that created them.
+    assert np.all(geometry_ends - geometry_starts > len(LINESTRING_PREFIX) + 1)
+    prefix = data[geometry_starts[:, None] + np.arange(len(LINESTRING_PREFIX))]
+    assert np.all(prefix == np.frombuffer(LINESTRING_PREFIX, dtype=np.uint8))
+    assert np.all(data[geometry_ends - 1] == ord(')'))
+
+    # The middle vertex of n vertices is number int(n / 2), it starts after
+    # the comma before it and ends at the comma after it (or the ')')
+    commas = np.flatnonzero(data == ord(','))
+    first_comma = np.searchsorted(commas, geometry_starts)
+    comma_count = np.searchsorted(commas, geometry_ends) - first_comma
+    middle = (comma_count + 1) // 2
+    commas = np.concatenate(([0], commas, [len(data)]))
+    vertex_starts = np.where(middle == 0, geometry_starts + len(LINESTRING_PREFIX),
+                             commas[first_comma + middle] + 1)
+    vertex_ends = np.where(middle == comma_count, geometry_ends - 1, commas[first_comma + middle + 1])
+
+    # One space between longitude and latitude
+    spaces = np.flatnonzero(data == ord(' '))
+    first_space = np.searchsorted(spaces, vertex_starts)
+    spaces = np.concatenate((spaces, [len(data), len(data)]))
+    separators = spaces[first_space]
+    if np.any(spaces[first_space + 1] < vertex_ends) or np.any(separators >= vertex_ends) \
+            or np.any(vertex_ends - vertex_starts > NUMBER_WIDTH):
+        return None
+
+    points = np.empty((len(postcodes), 2), dtype=np.float64)
+    points[:, 0] = _gather(data, vertex_starts, separators).astype(np.float64)
+    points[:, 1] = _gather(data, separators + 1, vertex_ends).astype(np.float64)
+
+    order = np.argsort(postcodes, kind='stable')
+    postcodes = postcodes[order]
+    unique_postcodes, first = np.unique(postcodes, return_index=True)
+    return {postcode.decode('ascii'): group
+            for postcode, group in zip(unique_postcodes, np.split(points[order], first[1:]))}
@@ -0,0 +1,66 @@
+"""
+Compact, array based alternative to the nodelist dict of compile_nodelist
+"""
+
+import numpy as np
+
+from .project import unproject_points
+
+# Points are the same node if they are equal at 8 decimals, like round_point()
+QUANTISATION = 10**8
+
+
+class NodeStore:
+    """
+    The unique nodes of a county. Node i has the id i + 1 (the same numbering
+    compile_nodelist uses) and the WGS84 coordinates lat[i], lon[i].
+    Segments refer to nodes by index.
+    """
+    __slots__ = ('lat', 'lon')
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, index):
+        """ Same (id, (lat, lon)) as nodelist[round_point(point)] """
+        return (int(index) + 1, (float(self.lat[index]), float(self.lon[index])))
+
+    def segments_arrays(self, segments):
+        """ ids, latitudes and longitudes of the nodes of all segments, one after another """
+        if segments:
+            indices = np.concatenate([np.asarray(segment, dtype=np.intp) for segment in segments])
+        else:
+            indices = np.zeros(0, dtype=np.intp)
+        return indices + 1, self.lat[indices], self.lon[indices]
+
+
+def node_index(segment_point):
+    """ round_point() for segments made of node indices """
+    return segment_point
+
+
+def compile_nodestore(coords):
+    """
+    Takes the (n, 2) array of all points of all features. Returns a
+    NodeStore with the unique points (in order of first appearance) and
+    for each point the index of its node, as int32 array.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+    keys = np.ascontiguousarray(np.round(coords * QUANTISATION).astype(np.int64))
+    keys = keys.view([('x', np.int64), ('y', np.int64)]).ravel()
+    _unique_keys, first_seen, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    # np.unique sorts by coordinates, renumber by first appearance
+    order = np.argsort(first_seen, kind='stable')
+    renumber = np.empty(len(order), dtype=np.int32)
+    renumber[order] = np.arange(len(order), dtype=np.int32)
+
+    projected = unproject_points(coords[first_seen[order]])
+    nodestore = NodeStore(np.ascontiguousarray(projected[:, 0]), np.ascontiguousarray(projected[:, 1]))
+
+    return nodestore, renumber[inverse.ravel()]
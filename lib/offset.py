@@ -0,0 +1,127 @@
+"""
+Vectorised version of the address way geometry in lib.convert: all
+segments of a county get pulled back, offset and their curves rounded in
+array operations over the flat coordinates of all segments
+"""
+
+import numpy as np
+
+# The approximate number of feet in one degree of latitude
+LAT_FEET = 364613
+
+
+def lon_feet(lats):
+    """ The approximate number of feet in one degree of longitude """
+    lrad = np.radians(lats)
+    return 365527.822 * np.cos(lrad) - 306.75853 * np.cos(3 * lrad) + 0.3937 * np.cos(5 * lrad)
+
+
+def offset_ways(ids, lats, lons, offsets, left, right, distance, pullback):
+    """
+    Same as lib.convert.offset_ways for many segments at once. The nodes
+    of segment i are ids, lats and lons [offsets[i]:offsets[i + 1]], at
+    least two. left and right are boolean arrays of the address ways each
+    segment gets. distance and pullback are in feet.
+    Returns the points of the left address ways as (n, 2) array of
+    (lat, lon) with offsets like the input, and the same for the right
+    ones. Segments have no points on a side not asked for.
+    """
+    distance = float(distance)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    segment_count = len(offsets) - 1
+    segment = np.repeat(np.arange(segment_count), np.diff(offsets))
+    if len(segment) == 0:
+        return np.zeros((0, 2)), np.zeros_like(offsets), np.zeros((0, 2)), np.zeros_like(offsets)
+
+    first = offsets[:-1]
+    last = offsets[1:] - 1
+    lons_feet = lon_feet(lats)
+
+    # Don't pull back the ends of very short ways too much
+    same_segment = segment[1:] == segment[:-1]
+    piece_lengths = np.sqrt(((lats[1:] - lats[:-1]) * LAT_FEET)**2
+                            + ((lons[1:] - lons[:-1]) * lons_feet[1:])**2)
+    seglength = np.bincount(segment[1:][same_segment], weights=piece_lengths[same_segment],
+                            minlength=segment_count)
+    pullback = np.where(seglength < float(pullback) * 3.0, seglength / 3.0, float(pullback))
+
+    # Skip points too close to start or end, except the end points themselves
+    # (preserves very short ways, but they will be rendered backwards)
+    point_pullback = pullback[segment]
+    first_id = ids[first][segment]
+    last_id = ids[last][segment]
+    to_first = np.sqrt((lats * LAT_FEET - lats[first][segment] * LAT_FEET)**2
+                       + (lons * lons_feet - lons[first][segment] * lons_feet)**2)
+    to_final = np.sqrt((lats * LAT_FEET - lats[last][segment] * LAT_FEET)**2
+                       + (lons * lons_feet - lons[last][segment] * lons_feet)**2)
+    skip = ((to_first < point_pullback) & (ids != last_id)) \
+           | ((to_final < point_pullback) & (ids != first_id) & (ids != last_id))
+    skip[first] = False
+
+    keep = ~skip
+    lats = lats[keep]
+    lons = lons[keep]
+    lons_feet = lons_feet[keep]
+    segment = segment[keep]
+    offsets = np.zeros(segment_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(segment, minlength=segment_count), out=offsets[1:])
+    first = offsets[:-1]
+    last = offsets[1:] - 1
+
+    # Offset of the piece from every remaining point to the next one, in
+    # feet. Pieces from the last point of a segment into the next are unused.
+    X = (lons[1:] - lons[:-1]) * lons_feet[1:]
+    Y = (lats[1:] - lats[:-1]) * LAT_FEET
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.pi/2 - np.arctan(X / Y)
+    Xp = np.where(Y != 0, np.sin(theta) * distance, 0.0)
+    Yp = np.where(Y != 0, np.cos(theta) * distance, np.where(X > 0, -distance, distance))
+    Xp = np.where(Y > 0, -Xp, Xp)
+    Yp = np.where(Y > 0, Yp, -Yp)
+
+    # Round the curves: the inner points use the average of the offsets of
+    # the pieces before and after them
+    inner = np.ones(len(lats), dtype=bool)
+    inner[first] = False
+    inner[last] = False
+    inner = np.flatnonzero(inner)
+    before = inner - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.where(Xp[before] != 0, np.abs(np.arctan(Yp[before] / Xp[before])), np.pi / 2) \
+                - np.where(Xp[inner] != 0, np.abs(np.arctan(Yp[inner] / Xp[inner])), np.pi / 2)
+    r = 1 + np.abs(np.tan(theta/2))
+    inner_lat = (Yp[inner] + Yp[before]) * r / (LAT_FEET * 2)
+    inner_lon = (Xp[inner] + Xp[before]) * r / (lons_feet[inner + 1] * 2)
+
+    # Pull back the first and the last point
+    first_dlon = - (Yp[first] * (pullback / distance)) / lons_feet[first + 1]
+    first_dlat = (Xp[first] * (pullback / distance)) / LAT_FEET
+    last_dlon = - (Yp[last - 1] * (pullback / distance)) / lons_feet[last]
+    last_dlat = (Xp[last - 1] * (pullback / distance)) / LAT_FEET
+
+    lsegments = np.empty((len(lats), 2))
+    lsegments[first, 0] = lats[first] + (Yp[first] / LAT_FEET) - first_dlat
+    lsegments[first, 1] = lons[first] + (Xp[first] / lons_feet[first + 1]) - first_dlon
+    lsegments[inner, 0] = lats[inner] + inner_lat
+    lsegments[inner, 1] = lons[inner] + inner_lon
+    lsegments[last, 0] = lats[last] + (Yp[last - 1] + Yp[last - 1]) / (LAT_FEET * 2) + last_dlat
+    lsegments[last, 1] = lons[last] + (Xp[last - 1] + Xp[last - 1]) / (lons_feet[last] * 2) + last_dlon
+
+    rsegments = np.empty((len(lats), 2))
+    rsegments[first, 0] = lats[first] - (Yp[first] / LAT_FEET) - first_dlat
+    rsegments[first, 1] = lons[first] - (Xp[first] / lons_feet[first + 1]) - first_dlon
+    rsegments[inner, 0] = lats[inner] - inner_lat
+    rsegments[inner, 1] = lons[inner] - inner_lon
+    rsegments[last, 0] = lats[last] - Yp[last - 1] / LAT_FEET + last_dlat
+    rsegments[last, 1] = lons[last] - Xp[last - 1] / lons_feet[last] + last_dlon
+
+    return side(lsegments, segment, offsets, np.asarray(left, dtype=bool)) \
+        + side(rsegments, segment, offsets, np.asarray(right, dtype=bool))
+
+
+def side(points, segment, offsets, wanted):
+    """ The points of the segments wanted, with their offsets """
+    counts = np.diff(offsets) * wanted
+    side_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(counts, out=side_offsets[1:])
+    return points[wanted[segment]], side_offsets
@@ -0,0 +1,147 @@
+"""
+Plain, gzip or zstd compressed CSV output. The header gets written as a
+separate gzip member / zstd frame, so the body of a county file can be
+appended to a single file (with just one header) by copying its bytes
+after the header, without decompressing it.
+"""
+
+import csv
+import gzip
+import io
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Same as gzip on the command line
+GZIP_LEVEL = 6
+
+# File name extension of each compression
+COMPRESSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+# The county files of convert_all (37143.csv, 37143.csv.gz, ...), not the
+# single file or .tmp files next to them
+COUNTY_CSV_REGEX = re.compile(r'^[0-9]{5}\.csv(%s)$' % '|'.join(re.escape(extension)
+                                                           for extension in COMPRESSIONS.values()))
+
+
+def check_compression(compression):
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression %s" % compression)
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstd compression needs the zstandard package (pip install zstandard)")
+
+
+def compressed_stream(raw_file, compression):
+    """
+    Binary stream that compresses into raw_file, closing it ends the
+    member / frame and leaves raw_file open. raw_file itself if uncompressed.
+    """
+    if compression == 'gzip':
+        # no name and time in the gzip header, so the output only depends on the data
+        return gzip.GzipFile(filename='', mode='wb', fileobj=raw_file, mtime=0, compresslevel=GZIP_LEVEL)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().stream_writer(raw_file, closefd=False)
+    return raw_file
+
+
+def compress(data, compression):
+    """ data as a complete gzip member / zstd frame """
+    if compression is None:
+        return data
+    raw_file = io.BytesIO()
+    with compressed_stream(raw_file, compression) as stream:
+        stream.write(data)
+    return raw_file.getvalue()
+
+
+def header_line(fieldnames):
+    line = io.StringIO()
+    csv.DictWriter(line, delimiter=';', fieldnames=fieldnames).writeheader()
+    return line.getvalue().encode('utf8')
+
+
+def header_bytes(fieldnames, compression=None):
+    """ How the header of a CSV file starts in the given compression """
+    return compress(header_line(fieldnames), compression)
+
+
+def write_csv(csv_filename, csv_lines, fieldnames, compression=None):
+    """
+    Writes the dicts csv_lines as semicolon separated CSV file, with the
+    header as separate member / frame if compressed. Returns the number of
+    rows.
+    """
+    check_compression(compression)
+
+    rows = 0
+    with open(csv_filename, 'wb') as raw_file:
+        raw_file.write(header_bytes(fieldnames, compression))
+
+        stream = compressed_stream(raw_file, compression)
+        text = io.TextIOWrapper(stream, encoding='utf8')
+        csv_writer = csv.DictWriter(text, delimiter=';', fieldnames=fieldnames)
+        for row in csv_lines:
+            csv_writer.writerow(row)
+            rows += 1
+        text.detach()
+        if stream is not raw_file:
+            stream.close()
+    return rows
+
+
+def csv_filenames(path):
+    """ All plain and compressed county CSV files of a directory, sorted """
+    return sorted(os.path.join(path, filename) for filename in os.listdir(path)
+                  if COUNTY_CSV_REGEX.match(filename))
+
+
+def open_csv(filename):
+    """ Opens a plain, .gz or .zst CSV file for reading text """
+    filename = str(filename)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', encoding='utf8')
+    if filename.endswith('.zst'):
+        check_compression('zstd')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf8')
+    return open(filename, encoding='utf8')
+
+
+class SingleFile:
+    """
+    One output file with a single header, made of the bodies of the
+    county files appended as they are done. Written to a .tmp file first,
+    call close() when complete.
+    """
+
+    def __init__(self, filename, fieldnames, compression=None):
+        check_compression(compression)
+        self.filename = filename
+        self.header = header_bytes(fieldnames, compression)
+        self.file = open(filename + '.tmp', 'wb')
+        self.file.write(self.header)
+
+    def append(self, csv_filename):
+        """ Copies the county file after its header """
+        with open(csv_filename, 'rb') as county_file:
+            if county_file.read(len(self.header)) != self.header:
+                raise ValueError("%s doesn't start with the expected header" % csv_filename)
+            while True:
+                chunk = county_file.read(1024 * 1024)
+                if not chunk:
+                    break
+                self.file.write(chunk)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.filename + '.tmp', self.filename)
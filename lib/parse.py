@@ -6,6 +6,8 @@ import os.path
 import json
 import re
 
+import numpy as np
+
 try:
     from osgeo import ogr
 except (ImportError, ModuleNotFoundError):
@@ -22,38 +24,125 @@ except (ImportError, ModuleNotFoundError):
 with open(os.path.dirname(__file__) + "/../tiger_county_fips.json", encoding="utf8") as json_file:
     county_fips_data = json.load(json_file)
 
-def parse_shp_for_geom_and_tags(filename):
+# '37143' => ('Perquimans', 'NC')
+county_and_state_by_fips = {}
+for _fips, _county_and_state in county_fips_data.items():
+    _result = re.match('^(.+), ([A-Z][A-Z])', _county_and_state)
+    if _result:
+        county_and_state_by_fips[_fips] = (_result[1], _result[2])
+
+def gdal_filename(filename):
+    """
+    Zip files (tl_2020_37143_edges.zip) get read through GDAL's virtual
+    file system instead of being unzipped first. Other filenames get
+    returned unchanged.
+    """
+    if not filename.endswith('.zip'):
+        return filename
+
+    shp_filename = os.path.basename(filename)[:-len('.zip')] + '.shp'
+    return '/vsizip/' + os.path.abspath(filename) + '/' + shp_filename
+
+# The attributes get_tags_from_feature looks at, all others can be skipped
+# when reading
+TAG_FIELDS = ['TLID', 'FULLNAME', 'STATEFP', 'COUNTYFP',
+              'LFROMADD', 'LTOADD', 'RFROMADD', 'RTOADD', 'ZIPL', 'ZIPR']
+
+# Only edges with a complete address range on at least one side end up as
+# address ways
+ADDRESS_FILTER = "(LFROMADD IS NOT NULL AND LTOADD IS NOT NULL)" \
+                 " OR (RFROMADD IS NOT NULL AND RTOADD IS NOT NULL)"
+
+def open_layer(filename, address_only=False, fields=None):
+    """
+    Opens the shapefile and returns the data source (which must be kept
+    alive while reading) and its layer.
+    address_only: let OGR skip all features without an address range
+    fields: names of the attributes to read, None reads all
+    """
     # ogr.RegisterAll()
 
     ogr_driver = ogr.GetDriverByName("ESRI Shapefile")
-    po_ds = ogr_driver.Open(filename)
+    po_ds = ogr_driver.Open(gdal_filename(str(filename)))
 
     if po_ds is None:
-        raise "Open failed."
+        raise OSError("Open failed: %s" % filename)
 
     po_layer = po_ds.GetLayer(0)
 
-    # fieldnames = []
-    # layer_definition = po_layer.GetLayerDefn()
-    # for i in range(layer_definition.GetFieldCount()):
-    #     fieldnames.append(layer_definition.GetFieldDefn(i).GetName())
-    # sys.stderr.write(",".join(fieldnames))
+    if fields is not None:
+        ignored_fields = []
+        layer_definition = po_layer.GetLayerDefn()
+        for i in range(layer_definition.GetFieldCount()):
+            fieldname = layer_definition.GetFieldDefn(i).GetName()
+            if fieldname not in fields:
+                ignored_fields.append(fieldname)
+        po_layer.SetIgnoredFields(ignored_fields)
+
+    if address_only:
+        po_layer.SetAttributeFilter(ADDRESS_FILTER)
 
     po_layer.ResetReading()
 
-    ret = []
+    return po_ds, po_layer
+
+def parse_shp_for_geom_and_tags(filename, address_only=False, fields=None, batched=False):
+    return list(iter_shp_for_geom_and_tags(filename, address_only, fields, batched))
+
+def parse_shp_for_coords_and_tags(filename, address_only=False, batched=False):
+    """
+    Reads TAG_FIELDS and all points of the shapefile into arrays. Returns
+    the (n, 2) array of points of all features, offsets (the points of
+    feature i are coords[offsets[i]:offsets[i + 1]]) and the list of tags.
+    """
+    if batched:
+        batches = list(iter_shp_batches(filename, address_only))
+        coords = [batch.coords for batch in batches]
+        counts = [np.diff(batch.offsets) for batch in batches]
+        tags = [tags for batch in batches for tags in batch.tags()]
+    else:
+        coords = []
+        counts = []
+        tags = []
+        for geom, feature_tags in iter_shp_for_geom_and_tags(filename, address_only, TAG_FIELDS):
+            coords.append(np.array(geom, dtype=np.float64).reshape(-1, 2))
+            counts.append(len(geom))
+            tags.append(feature_tags)
+
+    offsets = np.zeros(len(tags) + 1, dtype=np.int64)
+    if tags:
+        np.cumsum(np.concatenate([np.atleast_1d(count) for count in counts]), out=offsets[1:])
+
+    if coords:
+        coords = np.concatenate(coords)
+    else:
+        coords = np.zeros((0, 2), dtype=np.float64)
+
+    return coords, offsets, tags
+
+def iter_shp_for_geom_and_tags(filename, address_only=False, fields=None, batched=False):
+    """
+    Like parse_shp_for_geom_and_tags but yields one (geom, tags) at a time
+    while reading the layer.
+    batched: read through iter_shp_batches, which is much faster but
+    always reads TAG_FIELDS only
+    """
+    if batched:
+        for batch in iter_shp_batches(filename, address_only):
+            yield from batch.features()
+        return
+
+    _po_ds, po_layer = open_layer(filename, address_only, fields)
 
     po_feature = po_layer.GetNextFeature()
     while po_feature:
         tags = get_tags_from_feature(po_feature)
         geom = get_geometry_from_feature(po_feature)
 
-        ret.append( (geom, tags) )
+        yield (geom, tags)
 
         po_feature = po_layer.GetNextFeature()
 
-    return ret
-
 def get_geometry_from_feature(po_feature):
     geom = []
     rawgeom = po_feature.GetGeometryRef()
@@ -72,11 +161,10 @@ def get_tags_from_feature(po_feature):
     statefp = po_feature.GetField("STATEFP")
     countyfp = po_feature.GetField("COUNTYFP")
     if (statefp is not None) and (countyfp is not None):
-        county_and_state = county_fips_data.get(statefp + '' + countyfp)
-        if county_and_state: # e.g. 'Perquimans, NC'
-            result = re.match('^(.+), ([A-Z][A-Z])', county_and_state)
-            tags["tiger:county"] = result[1]
-            tags["tiger:state"] = result[2]
+        county_and_state = county_and_state_by_fips.get(statefp + '' + countyfp)
+        if county_and_state: # e.g. ('Perquimans', 'NC')
+            tags["tiger:county"] = county_and_state[0]
+            tags["tiger:state"] = county_and_state[1]
 
     lfromadd = po_feature.GetField("LFROMADD")
     if lfromadd is not None:
@@ -103,3 +191,149 @@ def get_tags_from_feature(po_feature):
         tags["tiger:zip_right"] = zipr
 
     return tags
+
+
+# Number of features read from OGR in one go
+BATCH_SIZE = 65536
+
+class FeatureBatch:
+    """
+    A block of features stored column by column. The points of feature i
+    are coords[offsets[i]:offsets[i + 1]] (x, y), columns maps each of
+    TAG_FIELDS to a list of values (None if unset), except TLID which is
+    an int64 array.
+    """
+    __slots__ = ('coords', 'offsets', 'columns')
+
+    def __init__(self, coords, offsets, columns):
+        self.coords = coords
+        self.offsets = offsets
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def features(self):
+        """
+        Yields (geom, tags) exactly like get_geometry_from_feature and
+        get_tags_from_feature would return them.
+        """
+        points = list(map(tuple, self.coords.tolist()))
+        offsets = self.offsets.tolist()
+
+        for i, tags in enumerate(self.tags()):
+            yield (points[offsets[i]:offsets[i + 1]], tags)
+
+    def tags(self):
+        """
+        Yields the tags of each feature like get_tags_from_feature.
+        """
+        columns = self.columns
+        tag_columns = (('tiger:lfromadd', columns['LFROMADD']),
+                       ('tiger:rfromadd', columns['RFROMADD']),
+                       ('tiger:ltoadd', columns['LTOADD']),
+                       ('tiger:rtoadd', columns['RTOADD']),
+                       ('tiger:zip_left', columns['ZIPL']),
+                       ('tiger:zip_right', columns['ZIPR']))
+
+        for i, (tlid, name, statefp, countyfp) in enumerate(zip(columns['TLID'].tolist(),
+                                                                columns['FULLNAME'],
+                                                                columns['STATEFP'],
+                                                                columns['COUNTYFP'])):
+            tags = {"tiger:way_id": tlid}
+            if name:
+                tags["name"] = name
+            if (statefp is not None) and (countyfp is not None):
+                county_and_state = county_and_state_by_fips.get(statefp + countyfp)
+                if county_and_state:
+                    tags["tiger:county"] = county_and_state[0]
+                    tags["tiger:state"] = county_and_state[1]
+            for key, column in tag_columns:
+                if column[i] is not None:
+                    tags[key] = column[i]
+
+            yield tags
+
+def iter_shp_batches(filename, address_only=False, batch_size=BATCH_SIZE):
+    """
+    Reads the shapefile in blocks of up to batch_size features and yields
+    them as FeatureBatch. Uses OGR's Arrow stream (GDAL >= 3.6) when
+    available, otherwise reads feature by feature with the field indices
+    looked up once.
+    """
+    _po_ds, po_layer = open_layer(filename, address_only, TAG_FIELDS)
+
+    if hasattr(po_layer, 'GetArrowStreamAsNumPy'):
+        yield from _iter_arrow_batches(po_layer, batch_size)
+    else:
+        yield from _iter_feature_batches(po_layer, batch_size)
+
+def _iter_arrow_batches(po_layer, batch_size):
+    geometry_column = po_layer.GetGeometryColumn() or 'wkb_geometry'
+    stream = po_layer.GetArrowStreamAsNumPy(options=['MAX_FEATURES_IN_BATCH=%d' % batch_size,
+                                                     'USE_MASKED_ARRAYS=NO'])
+    for arrow_batch in stream:
+        coords, offsets = linestrings_from_wkb(arrow_batch[geometry_column])
+
+        columns = {'TLID': np.asarray(arrow_batch['TLID'], dtype=np.int64)}
+        for fieldname in TAG_FIELDS[1:]:
+            columns[fieldname] = [_decode_string(value) for value in arrow_batch[fieldname]]
+
+        yield FeatureBatch(coords, offsets, columns)
+
+def _decode_string(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf8')
+    return value or None
+
+def _iter_feature_batches(po_layer, batch_size):
+    layer_definition = po_layer.GetLayerDefn()
+    field_indices = [(fieldname, layer_definition.GetFieldIndex(fieldname)) for fieldname in TAG_FIELDS]
+
+    while True:
+        columns = {fieldname: [] for fieldname in TAG_FIELDS}
+        column_indices = [(columns[fieldname], index) for fieldname, index in field_indices]
+        points = []
+        counts = []
+
+        po_feature = po_layer.GetNextFeature()
+        while po_feature:
+            for column, index in column_indices:
+                column.append(po_feature.GetField(index))
+            feature_points = po_feature.GetGeometryRef().GetPoints() or []
+            points.extend(point[:2] for point in feature_points)
+            counts.append(len(feature_points))
+
+            if len(counts) == batch_size:
+                break
+            po_feature = po_layer.GetNextFeature()
+
+        if not counts:
+            return
+
+        columns['TLID'] = np.array(columns['TLID'], dtype=np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        coords = np.array(points, dtype=np.float64).reshape(-1, 2)
+
+        yield FeatureBatch(coords, offsets, columns)
+
+        if len(counts) < batch_size:
+            return
+
+def linestrings_from_wkb(wkb_geometries):
+    """
+    Turns a sequence of little endian 2D WKB LineStrings into one (n, 2)
+    coordinate array plus offsets, without going through OGR geometries.
+    """
+    counts = np.zeros(len(wkb_geometries), dtype=np.int64)
+    for i, wkb in enumerate(wkb_geometries):
+        if wkb[0:5] != b'\x01\x02\x00\x00\x00':
+            raise ValueError("Only little endian 2D LineStrings are supported")
+        counts[i] = int.from_bytes(wkb[5:9], 'little')
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    coords = np.frombuffer(b''.join(wkb[9:] for wkb in wkb_geometries), dtype='<f8')
+
+    return coords.reshape(-1, 2).astype(np.float64), offsets
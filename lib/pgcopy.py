@@ -0,0 +1,59 @@
+"""
+Writes address ways as PostgreSQL binary COPY stream, to be loaded with
+
+    COPY tiger_import FROM '/path/37143.pgcopy' WITH (FORMAT binary)
+
+into a table with the columns (in this order, tlid only with --tlid)
+
+    tlid bigint, "from" bigint, "to" bigint, interpolation text, street text,
+    city text, state text, postcode text, geometry geometry(LineString, 4326)
+"""
+
+import struct
+
+from .output import check_compression, compressed_stream
+
+PGCOPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+# Columns sent as bigint, all others but the geometry are text
+INTEGER_COLUMNS = ('tlid', 'from', 'to')
+
+# The geometry column gets EWKB, which PostGIS accepts as binary input
+SRID = 4326
+
+
+def encode_field(column, value):
+    """ Length and binary representation of a field, NULL for None """
+    if value is None:
+        return struct.pack('>i', -1)
+    if column in INTEGER_COLUMNS:
+        return struct.pack('>iq', 8, value)
+    if column != 'geometry':
+        value = str(value).encode('utf8')
+    return struct.pack('>i', len(value)) + value
+
+
+def write_pgcopy(filename, rows, fieldnames, compression=None):
+    """
+    Writes the dicts rows (with EWKB geometry, see
+    lib.helpers.create_wkb_linestring, and ints in INTEGER_COLUMNS) as
+    binary COPY file. Returns the number of rows.
+    """
+    check_compression(compression)
+
+    count = 0
+    tuple_header = struct.pack('>h', len(fieldnames))
+    with open(filename, 'wb') as raw_file:
+        stream = compressed_stream(raw_file, compression)
+
+        # no flags, no header extension
+        stream.write(PGCOPY_SIGNATURE + struct.pack('>ii', 0, 0))
+        for row in rows:
+            stream.write(tuple_header + b''.join(encode_field(column, row.get(column))
+                                                 for column in fieldnames))
+            count += 1
+        stream.write(struct.pack('>h', -1))
+
+        if stream is not raw_file:
+            stream.close()
+    return count
@@ -0,0 +1,299 @@
+"""
+Centroids of the postcodes of the address ways, used by
+calculate_postcode_centroids.py
+"""
+
+from array import array
+from collections import defaultdict
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from statistics import mean
+import csv
+import os
+import re
+import logging
+
+import numpy as np
+
+from .midpoints import read_midpoints_mmap
+from .output import csv_filenames, open_csv
+
+LOG = logging.getLogger()
+
+# Outliers further away than that (in degrees) from the median get dropped,
+# trying the smallest distance that keeps at least 70% of the points first
+MAXDISTS = [0.1, 0.3, 0.5, 0.9]
+
+# Out of core, postcodes are kept in one partition per leading digits
+PARTITION_DIGITS = 2
+PARTITION_SIZE = 10**(5 - PARTITION_DIGITS)
+RECORD_DTYPE = np.dtype([('postcode', '<i4'), ('lon', '<f8'), ('lat', '<f8')])
+
+# Every float from 1 up to 2**10 is a multiple of 2**-52, so times this it is
+# an integer (US coordinates are in that range)
+MEAN_SCALE = 2**52
+
+# Files being read per worker process at a time. Finished ones wait in the
+# parent until they get merged, so more would only cost memory.
+FILES_IN_FLIGHT_PER_WORKER = 2
+
+
+def exact_mean(values):
+    """
+    Same result as statistics.mean() for an array of floats (the correctly
+    rounded mean), but summing the values as integers in numpy. Falls back
+    to statistics.mean() if any value isn't a multiple of 2**-52 below 2**10.
+    """
+    scaled = values * MEAN_SCALE
+    if not (np.all(np.abs(values) < 2**10) and np.all(scaled == np.trunc(scaled))):
+        return mean(values.tolist())
+
+    # Sum the upper and lower bits separately so int64 can't overflow
+    integers = scaled.astype(np.int64)
+    total = (int(np.sum(integers >> 26)) << 26) + int(np.sum(integers & (2**26 - 1)))
+
+    # Python's int division is correctly rounded, like statistics.mean()
+    return total / (len(values) * MEAN_SCALE)
+
+
+def read_midpoints(csv_file, postcode_summary=None):
+    """
+    Reads CSV lines with columns 'postcode' and 'geometry' and appends the
+    middle point of each geometry as [lon, lat] to postcode_summary[postcode].
+    Returns postcode_summary (a new one if none is given).
+    """
+    if postcode_summary is None:
+        postcode_summary = defaultdict(list)
+
+    for postcode, point in iter_midpoints(csv_file):
+        postcode_summary[postcode].append(point)
+
+    return postcode_summary
+
+
+def iter_midpoints(csv_file):
+    """ Yields (postcode, [lon, lat]) of the middle point of each CSV line """
+    reader = csv.DictReader(csv_file, delimiter=';')
+
+    cnt = 0
+    for row in reader:
+
+        postcode = row['postcode']
+
+        # In rare cases the postcode might be empty
+        if not re.match(r'^\d\d\d\d\d$', postcode):
+            continue
+
+        # If you 'cat *.csv' then you might end up with multiple CSV header lines.
+        # Skip those
+        if row['geometry'] == 'geometry':
+            continue
+
+        result = re.match(r'LINESTRING\((.+)\)$', row['geometry'])
+
+        # Fail if geometry can't be parsed. Shouldn't happen because it's one of
+        # our scripts that created them.
+        assert result
+
+        points = result[1].split(',')
+        yield postcode, [float(p) for p in points[int(len(points)/2)].split(' ')]
+
+        cnt += 1
+
+        if cnt % 1000000 == 0:
+            LOG.warning("Processed %s lines.", cnt)
+
+    LOG.warning("%s lines read.", cnt)
+
+
+def read_midpoints_file(filename):
+    """
+    read_midpoints() of one county CSV file (maybe compressed), as dict of
+    (n, 2) arrays
+    """
+    if filename.endswith('.csv'):
+        postcode_summary = read_midpoints_mmap(filename)
+        if postcode_summary is not None:
+            return postcode_summary
+
+    with open_csv(filename) as csv_file:
+        return {postcode: np.array(points, dtype=np.float64)
+                for postcode, points in read_midpoints(csv_file).items()}
+
+
+def read_midpoints_directory(path, workers=None, spool=None):
+    """
+    Reads all county CSV files (also compressed ones) of a directory (e.g. the
+    output of convert.sh) in a pool of worker processes and merges their
+    midpoints. Postcodes crossing county lines get the points of all
+    counties.
+    Returns a dict postcode => (n, 2) array, or with a MidpointSpool the
+    points get added there instead and the spool is returned. Only a few
+    files per worker are read ahead of the merging, so the midpoints of
+    the files don't pile up in memory beyond the spool's budget.
+    """
+    filenames = csv_filenames(path)
+    LOG.warning("Reading %d files.", len(filenames))
+
+    workers = workers or os.cpu_count()
+    remaining = iter(filenames)
+    partials = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {executor.submit(read_midpoints_file, filename)
+                   for filename in islice(remaining, workers * FILES_IN_FLIGHT_PER_WORKER)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                partial = future.result()
+                for postcode, points in partial.items():
+                    if spool is None:
+                        partials[postcode].append(points)
+                    else:
+                        spool.add_points(postcode, points)
+                del partial
+                for filename in islice(remaining, 1):
+                    running.add(executor.submit(read_midpoints_file, filename))
+
+    if spool is not None:
+        return spool
+    return {postcode: np.concatenate(points) for postcode, points in partials.items()}
+
+
+class MidpointSpool:
+    """
+    Keeps midpoints in compact buffers (a 4 byte postcode and two doubles
+    each) instead of lists, partitioned by the first PARTITION_DIGITS digits
+    of the postcode. Once the buffers hold more than memory_budget bytes,
+    they get appended to one file per partition in tmpdir. The partitions
+    can then be processed one after the other.
+    """
+
+    def __init__(self, tmpdir, memory_budget):
+        self.tmpdir = tmpdir
+        self.memory_budget = memory_budget
+        self.buffers = {}
+        self.buffered = 0
+        self.spilled = set()
+        self.spilled_points = 0
+
+    def _buffer(self, postcode):
+        partition = postcode // PARTITION_SIZE
+        if partition not in self.buffers:
+            self.buffers[partition] = (array('i'), array('d'))
+        return self.buffers[partition]
+
+    def add(self, postcode, point):
+        """ Adds one [lon, lat] of a postcode (given as string) """
+        postcodes, coords = self._buffer(int(postcode))
+        postcodes.append(int(postcode))
+        coords.extend(point)
+        self.buffered += RECORD_DTYPE.itemsize
+        if self.buffered > self.memory_budget:
+            self.spill()
+
+    def add_points(self, postcode, points):
+        """ Adds an (n, 2) array of [lon, lat] of a postcode """
+        postcodes, coords = self._buffer(int(postcode))
+        postcodes.extend([int(postcode)] * len(points))
+        coords.frombytes(np.ascontiguousarray(points, dtype=np.float64).tobytes())
+        self.buffered += RECORD_DTYPE.itemsize * len(points)
+        if self.buffered > self.memory_budget:
+            self.spill()
+
+    def _partition_filename(self, partition):
+        return os.path.join(self.tmpdir, 'midpoints-%0*d.bin' % (PARTITION_DIGITS, partition))
+
+    def _records(self, partition):
+        postcodes, coords = self.buffers[partition]
+        records = np.empty(len(postcodes), dtype=RECORD_DTYPE)
+        records['postcode'] = np.frombuffer(postcodes, dtype=np.int32)
+        coords = np.frombuffer(coords, dtype=np.float64).reshape(-1, 2)
+        records['lon'] = coords[:, 0]
+        records['lat'] = coords[:, 1]
+        return records
+
+    def spill(self):
+        """ Moves all buffered points to the partition files """
+        for partition in self.buffers:
+            records = self._records(partition)
+            with open(self._partition_filename(partition), 'ab') as file:
+                records.tofile(file)
+            self.spilled.add(partition)
+            self.spilled_points += len(records)
+
+        self.buffers = {}
+        self.buffered = 0
+
+    def partitions(self):
+        """
+        Yields a dict postcode => (n, 2) array of [lon, lat] for each
+        partition, in postcode order. Only one partition is loaded at a time.
+        """
+        if self.spilled_points:
+            LOG.warning("%d points were spilled to disk.", self.spilled_points)
+
+        for partition in sorted(self.spilled | set(self.buffers)):
+            parts = []
+            if partition in self.spilled:
+                parts.append(np.fromfile(self._partition_filename(partition), dtype=RECORD_DTYPE))
+                os.remove(self._partition_filename(partition))
+            if partition in self.buffers:
+                parts.append(self._records(partition))
+                del self.buffers[partition]
+            records = np.concatenate(parts)
+
+            order = np.argsort(records['postcode'], kind='stable')
+            records = records[order]
+            postcodes, starts = np.unique(records['postcode'], return_index=True)
+            coords = np.column_stack((records['lon'], records['lat']))
+            yield {'%05d' % postcode: points
+                   for postcode, points in zip(postcodes.tolist(), np.split(coords, starts[1:]))}
+
+
+def calculate_centroids_out_of_core(spool):
+    """ calculate_centroids() over all partitions of a MidpointSpool """
+    for postcode_summary in spool.partitions():
+        yield from calculate_centroids(postcode_summary)
+
+
+def calculate_centroids(postcode_summary):
+    """
+    Yields (postcode, lat, lon) sorted by postcode. The centroid is the
+    mean of the points after dropping outliers too far from the median.
+    postcode_summary has a list or (n, 2) array of [lon, lat] per postcode.
+    """
+    for postcode in sorted(postcode_summary):
+        points = np.asarray(postcode_summary[postcode], dtype=np.float64).reshape(-1, 2)
+
+        centroid = np.median(points, axis=0)
+        dists = np.sqrt((centroid[0] - points[:, 0])**2 + (centroid[1] - points[:, 1])**2)
+
+        for mxd in MAXDISTS:
+            inside = dists < mxd
+            count = int(np.count_nonzero(inside))
+
+            if count < 0.7 * len(points):
+                continue
+
+            if count < len(points):
+                LOG.warning("%s: Found %d outliers in %d points.", postcode, len(points) - count, len(points))
+                points = points[inside]
+
+            yield postcode, round(exact_mean(points[:, 1]), 6), round(exact_mean(points[:, 0]), 6)
+            break
+        else:
+            LOG.warning("%s: Dropped.", postcode)
+
+
+def write_centroids(out, centroids):
+    writer = csv.DictWriter(out, delimiter=',',
+                            fieldnames=['postcode', 'lat', 'lon'],
+                            lineterminator='\n')
+    writer.writeheader()
+
+    for postcode, lat, lon in centroids:
+        writer.writerow({
+            'postcode': postcode,
+            'lat': lat,
+            'lon': lon
+        })
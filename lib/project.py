@@ -2,6 +2,8 @@
 Deal with coordinate system transformations/projections
 """
 
+import numpy as np
+
 try:
     from osgeo import osr
 except (ImportError, ModuleNotFoundError):
@@ -30,3 +32,41 @@ def unproject(point):
     """Covert point to WGS84"""
     projected = transformer.TransformPoint(point[0], point[1])
     return (round(projected[0], 6), round(projected[1], 6))
+
+def unproject_points(points, fast_path=None):
+    """
+    Batch version of unproject: converts an (n, 2) array or list of points
+    to an (n, 2) array of WGS84 coordinates (same order as unproject
+    returns them), rounded to 6 decimals.
+    fast_path: skip the transformation and only swap the axes, defaults to
+    TRANSFORM_IS_NOOP
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if fast_path is None:
+        fast_path = TRANSFORM_IS_NOOP
+
+    if fast_path:
+        projected = points[:, ::-1]
+    elif len(points) == 0:
+        projected = points
+    else:
+        projected = np.array(transformer.TransformPoints(points.tolist()), dtype=np.float64)[:, :2]
+
+    return np.round(projected, 6)
+
+def _transform_is_noop():
+    """
+    True if the transformation doesn't move any point of a grid covering
+    the US (Guam and the Aleutians included) by more than 1e-9 degrees,
+    i.e. it makes no difference once rounded to 6 decimals.
+    """
+    lons, lats = np.meshgrid(np.concatenate((np.arange(-180.0, -64.0, 2.0), np.arange(144.0, 180.0, 2.0))),
+                             np.arange(13.0, 72.0, 1.0))
+    grid = np.column_stack((lons.ravel(), lats.ravel()))
+    projected = np.array(transformer.TransformPoints(grid.tolist()), dtype=np.float64)[:, :2]
+
+    return bool(np.all(np.abs(projected - grid[:, ::-1]) < 1e-9))
+
+# NAD83 to WGS84 is usually a null transformation. Should PROJ pick a real
+# datum shift, every point gets transformed.
+TRANSFORM_IS_NOOP = _transform_is_noop()
@@ -0,0 +1,112 @@
+"""
+The attributes of an edge that the address ways need, parsed once when the
+waylist gets compiled: the address ranges are validated and their
+interpolation decided per edge instead of for every address way, and the
+repeated strings (street, county, state, postcodes) are interned.
+"""
+
+import sys
+
+
+def parse_range(start, end, non_integer=None):
+    """
+    (start, end) as ints like check_if_integers would accept them, None if
+    one is missing or not an integer. Counts the non integer values in the
+    Counter non_integer.
+    """
+    numbers = []
+    for number in (start, end):
+        if not number:
+            return None
+        try:
+            numbers.append(int(number))
+        except ValueError:
+            if non_integer is not None:
+                non_integer[number] += 1
+            return None
+    return tuple(numbers)
+
+
+def range_interpolation(this, other):
+    """
+    interpolation_type for parsed ranges: 'even', 'odd' or 'all' for the
+    (from, to) range this, depending on the range other on the other side.
+    None if this is None.
+    """
+    if this is None:
+        return None
+
+    if other is not None:
+        if this[0] % 2 == 0 and this[1] % 2 == 0:
+            if other[0] % 2 == 1 and other[1] % 2 == 1:
+                return "even"
+
+        elif this[0] % 2 == 1 and this[1] % 2 == 1:
+            if other[0] % 2 == 0 and other[1] % 2 == 0:
+                return "odd"
+
+    return "all"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class AddressRecord:
+    """
+    The tags of a feature (see lib.parse.get_tags_from_feature). Unset
+    tags are None. Records with equal tags are equal, so they can group
+    the features of a waylist.
+    lrange / rrange: the left / right address range as (from, to) ints,
+    None if that side has no valid address range
+    linterpolation / rinterpolation: interpolation of the left / right
+    address way, None if that side has no valid address range
+    """
+    __slots__ = ('tlid', 'name', 'county', 'state', 'lfromadd', 'ltoadd', 'rfromadd', 'rtoadd',
+                 'zip_left', 'zip_right', 'lrange', 'rrange', 'linterpolation', 'rinterpolation')
+
+    def __init__(self, tags, non_integer=None):
+        self.tlid = tags['tiger:way_id']
+        self.name = _intern(tags.get('name'))
+        self.county = _intern(tags.get('tiger:county'))
+        self.state = _intern(tags.get('tiger:state'))
+        self.lfromadd = tags.get('tiger:lfromadd')
+        self.ltoadd = tags.get('tiger:ltoadd')
+        self.rfromadd = tags.get('tiger:rfromadd')
+        self.rtoadd = tags.get('tiger:rtoadd')
+        self.zip_left = _intern(tags.get('tiger:zip_left'))
+        self.zip_right = _intern(tags.get('tiger:zip_right'))
+
+        self.lrange = parse_range(self.lfromadd, self.ltoadd, non_integer)
+        self.rrange = parse_range(self.rfromadd, self.rtoadd, non_integer)
+        self.linterpolation = range_interpolation(self.lrange, self.rrange)
+        self.rinterpolation = range_interpolation(self.rrange, self.lrange)
+
+    @property
+    def left(self):
+        return self.linterpolation is not None
+
+    @property
+    def right(self):
+        return self.rinterpolation is not None
+
+    def _key(self):
+        return (self.tlid, self.name, self.county, self.state, self.lfromadd, self.ltoadd,
+                self.rfromadd, self.rtoadd, self.zip_left, self.zip_right)
+
+    def __eq__(self, other):
+        return isinstance(other, AddressRecord) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'AddressRecord(%r)' % (self._key(),)
+
+
+def non_integer_summary(non_integer, examples=5):
+    """ One line about the non integer address range values of a Counter """
+    if not non_integer:
+        return None
+    most_common = ', '.join('%s (%d)' % (value, count) for value, count in non_integer.most_common(examples))
+    return "Non integer addresses: %d, most common: %s" % (sum(non_integer.values()), most_common)
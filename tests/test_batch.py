@@ -0,0 +1,257 @@
+import os
+import queue
+from concurrent.futures import Future
+import shutil
+import gzip
+import zipfile
+import pytest
+import lib.batch
+from lib.batch import find_county_files, convert_all, convert_pipelined, pipeline_worker
+from lib.manifest import read_manifest, file_sha256
+from lib.instrument import Instrumentation, read_report
+
+def test_find_county_files(tmp_path):
+    with open(tmp_path / 'tl_2020_37143_edges.zip', 'wb') as file:
+        file.write(b'x' * 10)
+    with open(tmp_path / 'tl_2020_06037_edges.zip', 'wb') as file:
+        file.write(b'x' * 100)
+    with open(tmp_path / 'tl_2020_06037_faces.zip', 'wb') as file:
+        file.write(b'x' * 1000)
+
+    assert find_county_files(tmp_path) == [
+        ('06037', os.path.join(tmp_path, 'tl_2020_06037_edges.zip')),
+        ('37143', os.path.join(tmp_path, 'tl_2020_37143_edges.zip'))
+    ]
+
+@pytest.fixture
+def paths(tmp_path):
+    """ Input directory with the 37143 fixture and an empty output directory """
+    inpath = tmp_path / 'in'
+    outpath = tmp_path / 'out'
+    inpath.mkdir()
+    outpath.mkdir()
+    shutil.copy('tests/fixtures/tl_2020_37143_edges.zip', inpath)
+    return inpath, outpath
+
+def test_convert_all(paths):
+    inpath, outpath = paths
+
+    assert convert_all(inpath, outpath, workers=2) == []
+    assert sorted(os.listdir(outpath)) == ['37143.csv', 'manifest.jsonl']
+
+    with open(outpath / '37143.csv', encoding='utf8') as file:
+        with open('tests/fixtures/expected_37143.csv', encoding='utf8') as expected:
+            assert file.read() == expected.read()
+
+def test_convert_all_skips_unchanged(paths, capsys):
+    inpath, outpath = paths
+
+    assert convert_all(inpath, outpath, workers=1) == []
+    manifest = read_manifest(outpath)
+    assert list(manifest) == ['37143']
+    assert manifest['37143']['output_sha256'] == file_sha256('tests/fixtures/expected_37143.csv')
+    capsys.readouterr()
+
+    assert convert_all(inpath, outpath, workers=1) == []
+    assert "Skipped 1 unchanged counties." in capsys.readouterr().out
+
+    # options which don't change the output
+    assert convert_all(inpath, outpath, workers=1, options={'nodestore': True, 'batched': True}) == []
+    assert "Skipped 1 unchanged counties." in capsys.readouterr().out
+
+    # different parameters
+    assert convert_all(inpath, outpath, workers=1, options={'engine': 'numpy'}) == []
+    assert "Skipped 0 unchanged counties." in capsys.readouterr().out
+    assert read_manifest(outpath)['37143']['parameters']['engine'] == 'numpy'
+
+    # output changed since
+    with open(outpath / '37143.csv', 'a', encoding='utf8') as file:
+        file.write('\n')
+    assert convert_all(inpath, outpath, workers=1, options={'engine': 'numpy'}) == []
+    assert "Skipped 0 unchanged counties." in capsys.readouterr().out
+
+    assert convert_all(inpath, outpath, workers=1, options={'engine': 'numpy'}, force=True) == []
+    assert "Skipped 0 unchanged counties." in capsys.readouterr().out
+
+def test_convert_all_report(tmp_path, paths, capsys):
+    inpath, outpath = paths
+
+    assert convert_all(inpath, outpath, workers=1, report_filename=tmp_path / 'report.jsonl') == []
+    assert "slowest county" in capsys.readouterr().out
+
+    [record] = read_report(tmp_path / 'report.jsonl')
+    assert record['county'] == '37143'
+    assert {stage['stage']: stage['counts'] for stage in record['stages']} == {
+        'parse': {'features': 1663},
+        'compile_nodelist': {'nodes': 11123},
+        'compile_waylist': {'ways': 1663, 'chains': 1663, 'non_integer': 25},
+        'addressways': {'rows': 2817},
+        'write': {'rows': 2817}
+    }
+
+def test_convert_all_single_file(tmp_path, paths):
+    inpath, outpath = paths
+
+    assert convert_all(inpath, outpath, workers=1, options={'compression': 'gzip'},
+                       single_filename=str(tmp_path / 'tiger.csv.gz')) == []
+    assert sorted(os.listdir(outpath)) == ['37143.csv.gz', 'manifest.jsonl']
+
+    with open('tests/fixtures/expected_37143.csv', 'rb') as expected:
+        expected = expected.read()
+    for filename in (outpath / '37143.csv.gz', tmp_path / 'tiger.csv.gz'):
+        with gzip.open(filename, 'rb') as file:
+            assert file.read() == expected
+
+def test_convert_all_pgcopy(tmp_path, paths):
+    inpath, outpath = paths
+
+    assert convert_all(inpath, outpath, workers=1, options={'output_format': 'pgcopy'}) == []
+    assert sorted(os.listdir(outpath)) == ['37143.pgcopy', 'manifest.jsonl']
+
+    with pytest.raises(ValueError):
+        convert_all(inpath, outpath, workers=1, options={'output_format': 'pgcopy'},
+                    single_filename=str(tmp_path / 'tiger.pgcopy'))
+
+def test_convert_all_pipeline(tmp_path, paths, capsys):
+    inpath, outpath = paths
+    # same data as another county, the files in the zip are named like the zip
+    with zipfile.ZipFile('tests/fixtures/tl_2020_37143_edges.zip') as source, \
+         zipfile.ZipFile(inpath / 'tl_2020_37001_edges.zip', 'w') as copy:
+        for name in source.namelist():
+            copy.writestr(name.replace('37143', '37001'), source.read(name))
+    with open(inpath / 'tl_2020_37002_edges.zip', 'wb') as file:
+        file.write(b'not a zip file')
+
+    assert convert_all(inpath, outpath, workers=2, pipeline=True, report_filename=str(tmp_path / 'report.jsonl'),
+                       options={'nodestore': True}) == ['37002']
+    assert sorted(os.listdir(outpath)) == ['37001.csv', '37143.csv', 'manifest.jsonl']
+    assert sorted(read_manifest(outpath)) == ['37001', '37143']
+
+    with open('tests/fixtures/expected_37143.csv', 'rb') as expected:
+        expected = expected.read()
+    for countyid in ('37001', '37143'):
+        with open(outpath / (countyid + '.csv'), 'rb') as file:
+            assert file.read() == expected
+
+    records = read_report(tmp_path / 'report.jsonl')
+    assert sorted(record['county'] for record in records) == ['37001', '37143']
+    assert [stage['stage'] for stage in records[0]['stages']] == \
+        ['parse', 'compile_nodestore', 'addressways', 'write']
+    capsys.readouterr()
+
+    os.remove(inpath / 'tl_2020_37002_edges.zip')
+    assert convert_all(inpath, outpath, workers=1, pipeline=True, options={'nodestore': True}) == []
+    assert "Skipped 2 unchanged counties." in capsys.readouterr().out
+
+def test_convert_all_pipeline_read_error(paths):
+    inpath, outpath = paths
+    # a zip file without the shapefile
+    with zipfile.ZipFile(inpath / 'tl_2020_37001_edges.zip', 'w') as file:
+        file.writestr('readme.txt', 'no edges')
+
+    assert convert_all(inpath, outpath, workers=1, pipeline=True) == ['37001']
+    assert sorted(os.listdir(outpath)) == ['37143.csv', 'manifest.jsonl']
+
+def test_pipeline_worker_read_error(tmp_path, monkeypatch):
+    def read_shape(*args, **kwargs):
+        raise OSError('read')
+    monkeypatch.setattr(lib.batch, 'read_shape', read_shape)
+
+    jobs = queue.Queue()
+    jobs.put(('37143', 'tests/fixtures/tl_2020_37143_edges.zip', str(tmp_path / '37143.csv'), None))
+    jobs.put(None)
+    results = queue.Queue()
+    pipeline_worker(jobs, results, {}, 'version')
+
+    countyid, result, exc = results.get_nowait()
+    assert (countyid, result, str(exc)) == ('37143', None, 'read')
+    assert results.empty()
+
+def test_convert_pipelined_late_result(monkeypatch):
+    futures = []
+
+    class Executor:
+        def __init__(self, max_workers):
+            pass
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            pass
+        def submit(self, *args):
+            futures.append(Future())
+            return futures[-1]
+
+    class Results(queue.Queue):
+        def get(self, block=True, timeout=None):
+            if self.empty() and not futures[0].done():
+                # the worker puts its result and ends just after the poll timed out
+                self.put(('37143', ('entry', True, None), None))
+                futures[0].set_result(None)
+                raise queue.Empty()
+            return super().get(block, timeout)
+
+    class Manager:
+        def __init__(self):
+            self.queues = iter([queue.Queue(), Results()])
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc_info):
+            pass
+        def Queue(self): # pylint: disable=invalid-name
+            return next(self.queues)
+
+    monkeypatch.setattr(lib.batch, 'ProcessPoolExecutor', Executor)
+    monkeypatch.setattr(lib.batch, 'Manager', Manager)
+    assert list(convert_pipelined([('37143', 'in.zip', '37143.csv', None)], 1, {}, 'version')) == \
+        [('37143', '37143.csv', ('entry', True, None), None)]
+
+def test_pipeline_worker_job_queue_error():
+    class BrokenQueue:
+        def get(self):
+            raise EOFError()
+
+    results = queue.Queue()
+    pipeline_worker(BrokenQueue(), results, {}, 'version')
+    countyid, result, exc = results.get_nowait()
+    assert countyid is None and result is None
+    assert isinstance(exc, EOFError)
+
+def test_pipeline_worker_write_error(tmp_path, monkeypatch):
+    def record(_self):
+        raise RuntimeError('record')
+    monkeypatch.setattr(Instrumentation, 'record', record)
+
+    jobs = queue.Queue()
+    for countyid in ('37143', '37001'):
+        jobs.put((countyid, 'tests/fixtures/tl_2020_37143_edges.zip', str(tmp_path / (countyid + '.csv')), None))
+    jobs.put(None)
+    results = queue.Queue()
+    pipeline_worker(jobs, results, {}, 'version')
+
+    assert sorted((countyid, str(exc)) for countyid, _result, exc in [results.get_nowait(), results.get_nowait()]) \
+        == [('37001', 'record'), ('37143', 'record')]
+    assert results.empty()
+
+def test_convert_all_pipeline_not_streaming(tmp_path):
+    with pytest.raises(ValueError):
+        convert_all(tmp_path, tmp_path, pipeline=True, options={'streaming': True})
+
+def test_convert_all_cache(tmp_path, paths):
+    inpath, _outpath = paths
+
+    with open('tests/fixtures/expected_37143.csv', 'rb') as expected:
+        expected = expected.read()
+    for run, pipeline in enumerate((False, True, False)):
+        outpath = tmp_path / ('out%d' % run)
+        outpath.mkdir()
+        assert convert_all(inpath, outpath, workers=1, pipeline=pipeline, cache_dir=str(tmp_path / 'cache'),
+                           report_filename=str(tmp_path / ('report%d.jsonl' % run))) == []
+        with open(outpath / '37143.csv', 'rb') as file:
+            assert file.read() == expected
+
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+    first_stages = [stage['stage'] for stage in read_report(tmp_path / 'report0.jsonl')[0]['stages']]
+    assert 'save_cache' in first_stages
+    for run in (1, 2):
+        stages = [stage['stage'] for stage in read_report(tmp_path / ('report%d.jsonl' % run))[0]['stages']]
+        assert stages == ['load_cache', 'addressways', 'write']
@@ -0,0 +1,66 @@
+import os
+import shutil
+import numpy as np
+import lib.convert
+from lib.cache import cache_path, code_version, save_cache, load_cache
+from lib.convert import compile_nodestore_and_waylist, addressways, shape_to_csv
+from lib.parse import parse_shp_for_coords_and_tags
+
+FIXTURE = 'tests/fixtures/tl_2020_37143_edges.zip'
+
+def test_cache_path(tmp_path):
+    shutil.copytree('tests/fixtures/tl_2020_37143_edges', tmp_path / 'shp')
+    shp_filename = str(tmp_path / 'shp' / 'tl_2020_37143_edges.shp')
+    path = cache_path('cache', shp_filename)
+    assert code_version() in os.path.basename(path)
+    assert cache_path('cache', shp_filename, address_only=False) != path
+
+    # the attributes are in the .dbf next to the .shp
+    with open(tmp_path / 'shp' / 'tl_2020_37143_edges.dbf', 'ab') as file:
+        file.write(b' ')
+    assert cache_path('cache', shp_filename) != path
+
+def test_save_and_load_cache(tmp_path):
+    coords, offsets, tags = parse_shp_for_coords_and_tags(FIXTURE, address_only=True)
+    nodestore, waylist = compile_nodestore_and_waylist(coords, offsets, tags)
+
+    path = cache_path(str(tmp_path), FIXTURE)
+    assert load_cache(path) is None
+    save_cache(path, nodestore, waylist)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+    cached_nodestore, cached_waylist = load_cache(path)
+    assert isinstance(cached_nodestore.lat.base, np.memmap)
+    assert np.array_equal(cached_nodestore.lat, nodestore.lat)
+    assert np.array_equal(cached_nodestore.lon, nodestore.lon)
+    assert list(cached_waylist) == list(waylist)
+    for cached_segments, segments in zip(cached_waylist.values(), waylist.values()):
+        assert [chain.tolist() for chain in cached_segments] == [chain.tolist() for chain in segments]
+
+    assert addressways(cached_waylist, cached_nodestore, len(nodestore) + 1) == \
+        addressways(waylist, nodestore, len(nodestore) + 1)
+
+def test_save_empty_cache(tmp_path):
+    coords, offsets, tags = np.zeros((0, 2)), np.zeros(1, dtype=np.int64), []
+    nodestore, waylist = compile_nodestore_and_waylist(coords, offsets, tags)
+    save_cache(str(tmp_path / 'empty'), nodestore, waylist)
+
+    cached_nodestore, cached_waylist = load_cache(str(tmp_path / 'empty'))
+    assert len(cached_nodestore) == 0 and cached_waylist == {}
+
+def test_shape_to_csv_cache(tmp_path, monkeypatch):
+    shape_to_csv(FIXTURE, tmp_path / 'first.csv', cache_dir=str(tmp_path / 'cache'))
+
+    # the second run doesn't read the shapefile
+    def no_parsing(*args, **kwargs):
+        raise AssertionError("shapefile parsed")
+    monkeypatch.setattr(lib.convert, 'parse_shp_for_coords_and_tags', no_parsing)
+    shape_to_csv(FIXTURE, tmp_path / 'second.csv', cache_dir=str(tmp_path / 'cache'))
+    shape_to_csv(FIXTURE, tmp_path / 'numpy.csv', cache_dir=str(tmp_path / 'cache'), engine='numpy')
+
+    with open('tests/fixtures/expected_37143.csv', 'rb') as expected:
+        expected = expected.read()
+    for filename in ('first.csv', 'second.csv'):
+        with open(tmp_path / filename, 'rb') as file:
+            assert file.read() == expected
+    assert os.path.getsize(tmp_path / 'numpy.csv') > 0
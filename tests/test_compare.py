@@ -0,0 +1,37 @@
+import csv
+import numpy as np
+import pytest
+from lib.compare import read_centroids, haversine, CentroidTable, CentroidDiff
+
+def test_read_centroids():
+    table = read_centroids('tests/fixtures/expected_us_postcodes.csv')
+    assert len(table) == 7
+    assert table.postcodes[0] == '27919'
+    assert (table.lat[0], table.lon[0]) == (36.307466, -76.521998)
+
+def test_haversine():
+    assert haversine(np.array([36.1]), np.array([-76.5]), np.array([36.2]), np.array([-76.5])) \
+        == pytest.approx([11122.6], abs=0.1)
+
+def test_centroid_diff(tmp_path):
+    old = CentroidTable(['27919', '27932', '27944', '00501'], [36.3, 36.1, 36.2, 40.8], [-76.5, -76.5, -76.4, -73.0])
+    new = CentroidTable(['27944', '27919', '27932', '99999'], [36.2001, 36.3, 36.2, 1.0], [-76.4, -76.5, -76.5, 1.0])
+    diff = CentroidDiff(old, new)
+
+    assert diff.added.tolist() == ['99999']
+    assert diff.deleted.tolist() == ['00501']
+    assert diff.moved.tolist() == ['27932', '27944']
+    assert diff.moved_more_than(100) == 1
+    assert diff.histogram() == [(1, 0), (10, 0), (100, 1), (1000, 0), (10000, 0), (100000, 1), (np.inf, 0)]
+
+    diff.write_moved(tmp_path / 'moved.csv')
+    with open(tmp_path / 'moved.csv', encoding='utf8') as file:
+        assert [row['postcode'] for row in csv.DictReader(file)] == ['27932', '27944']
+
+    assert 'Average distance difference of all updates: 5566.88 meters' in diff.summary()
+
+def test_centroid_diff_nothing_moved():
+    table = read_centroids('tests/fixtures/expected_us_postcodes.csv')
+    summary = CentroidDiff(table, table).summary()
+    assert summary[2] == 'Position moved: 0 (0.000%)'
+    assert 'Average distance difference of all updates: -' in summary
@@ -1,4 +1,11 @@
-from lib.convert import compile_nodelist, compile_waylist, addressways
+import re
+import pytest
+from lib.convert import compile_nodelist, compile_waylist, addressways, \
+                        stream_addressways, shape_to_csv, compile_nodestore_and_waylist, CSV_FIELDNAMES
+from lib.output import write_csv
+from lib.parse import parse_shp_for_geom_and_tags
+from lib.helpers import glom_all
+from lib.record import AddressRecord
 
 parsed_gisdata = [
     (
@@ -30,14 +37,43 @@ def test_compile_nodelist():
 def test_compile_waylist():
     waylist = compile_waylist(parsed_gisdata)
     assert waylist == {
-        (('tiger:way_id', 98), ('name', 'Main Rd')): [
+        AddressRecord({'tiger:way_id': 98, 'name': 'Main Rd'}): [
             [(1.1, 2.1), (1.2, 2.2)]
         ],
-        (('tiger:way_id', 99), ('name', 'Tree Rd')): [
+        AddressRecord({'tiger:way_id': 99, 'name': 'Tree Rd'}): [
             [(1.2, 2.1), (1.2, 2.2), (1.2, 2.3)]
         ]
     }
 
+def compile_waylist_reference(parsed_gisdata):
+    # The original grouping by a tuple of all tags
+    waylist = {}
+    for geom, tags in parsed_gisdata:
+        waylist.setdefault(tuple(tags.items()), []).append(geom)
+    return [(dict(tags), glom_all(segments)) for tags, segments in waylist.items()]
+
+def test_compile_waylist_differing_tags():
+    features = [
+        ([(1.0, 1.0), (1.0, 2.0)], {'tiger:way_id': 5, 'name': 'A St'}),
+        ([(2.0, 1.0), (2.0, 2.0)], {'tiger:way_id': 6, 'name': 'B St'}),
+        ([(1.0, 2.0), (1.0, 3.0)], {'tiger:way_id': 5, 'name': 'A Street'}),
+        ([(1.0, 0.0), (1.0, 1.0)], {'tiger:way_id': 5, 'name': 'A St'}),
+        ([(2.0, 2.0), (2.0, 3.0)], {'tiger:way_id': 6, 'name': 'B St'}),
+    ]
+    waylist = compile_waylist(features)
+    expected = compile_waylist_reference(features)
+
+    assert [(record.tlid, record.name) for record in waylist] == \
+        [(5, 'A St'), (6, 'B St'), (5, 'A Street')]
+    assert list(waylist.items()) == [(AddressRecord(tags), segments) for tags, segments in expected]
+
+def test_compile_waylist_same_as_reference():
+    features = parse_shp_for_geom_and_tags('tests/fixtures/tl_2020_37143_edges.zip')
+    waylist = compile_waylist(features)
+    expected = compile_waylist_reference(features)
+
+    assert list(waylist.items()) == [(AddressRecord(tags), segments) for tags, segments in expected]
+
 def test_addressways():
     for _geom, tags in parsed_gisdata:
         tags["tiger:lfromadd"] = 100
@@ -92,3 +128,119 @@ def test_addressways():
             'geometry': 'LINESTRING(1.199918 2.100123,1.199918 2.200000,1.199918 2.299877)'
         }
     ]
+
+def test_addressways_zero_padded_range(tmp_path):
+    features = [([(1.1, 2.1), (1.2, 2.2)], {'tiger:way_id': 98, 'name': 'Main Rd',
+                                            'tiger:lfromadd': '0100', 'tiger:ltoadd': '0198'})]
+    i, nodelist = compile_nodelist(features)
+    waylist = compile_waylist(features)
+
+    # the CSV keeps the values of the shapefile, the binary formats get ints
+    rows = addressways(waylist, nodelist, i)
+    assert [(row['from'], row['to']) for row in rows] == [('0100', '0198')]
+    assert [(row['from'], row['to']) for row in addressways(waylist, nodelist, i, int_ranges=True)] == [(100, 198)]
+
+    write_csv(str(tmp_path / 'out.csv'), rows, CSV_FIELDNAMES)
+    with open(tmp_path / 'out.csv', encoding='utf8') as file:
+        assert file.read().splitlines()[1].startswith('0100;0198;all;Main Rd;')
+
+@pytest.fixture
+def features():
+    """ Three edges of two ways, with address ranges on both sides """
+    ranges = {'tiger:lfromadd': 100, 'tiger:ltoadd': 200, 'tiger:rfromadd': 101, 'tiger:rtoadd': 201}
+    return [
+        ([(1.1, 2.1), (1.2, 2.2)], dict(ranges, **{'tiger:way_id': 98, 'name': 'Main Rd'})),
+        ([(1.2, 2.1), (1.2, 2.2)], dict(ranges, **{'tiger:way_id': 99, 'name': 'Tree Rd'})),
+        ([(1.2, 2.2), (1.2, 2.3)], dict(ranges, **{'tiger:way_id': 99, 'name': 'Tree Rd'}))
+    ]
+
+def test_stream_addressways(features):
+    i, nodelist = compile_nodelist(features)
+    waylist = compile_waylist(features)
+
+    assert list(stream_addressways(iter(features))) == addressways(waylist, nodelist, i)
+
+def test_shape_to_csv_streaming(tmp_path):
+    shape_to_csv('tests/fixtures/tl_2020_37143_edges.zip', tmp_path / 'out.csv', streaming=True)
+
+    with open(tmp_path / 'out.csv', encoding='utf8') as file:
+        with open('tests/fixtures/expected_37143.csv', encoding='utf8') as expected:
+            assert file.read() == expected.read()
+
+def test_addressways_numpy_engine(features):
+    # ways with a range on one side only, or none
+    features = features + [
+        ([(1.3, 2.2), (1.3, 2.3)], {'tiger:way_id': 100, 'name': 'Left St',
+                                    'tiger:lfromadd': '2', 'tiger:ltoadd': '8'}),
+        ([(1.4, 2.2), (1.4, 2.3), (1.4, 2.4)], {'tiger:way_id': 101, 'name': 'Right St',
+                                                'tiger:rfromadd': '1', 'tiger:rtoadd': '9'}),
+        ([(1.5, 2.2), (1.5, 2.3)], {'tiger:way_id': 102, 'name': 'No St',
+                                    'tiger:lfromadd': 'P2', 'tiger:ltoadd': '8'})
+    ]
+    i, nodelist = compile_nodelist(features)
+    waylist = compile_waylist(features)
+
+    scalar = addressways(waylist, nodelist, i)
+    assert [(row['street'], row['from']) for row in scalar] == [
+        ('Main Rd', 101), ('Main Rd', 100), ('Tree Rd', 101), ('Tree Rd', 100), ('Left St', '2'), ('Right St', '1')
+    ]
+    assert addressways(waylist, nodelist, i, engine='numpy') == scalar
+
+    coords = [point for geom, _tags in features for point in geom]
+    offsets = [0]
+    for geom, _tags in features:
+        offsets.append(offsets[-1] + len(geom))
+    nodestore, waylist = compile_nodestore_and_waylist(coords, offsets, [tags for _geom, tags in features])
+    assert addressways(waylist, nodestore, len(nodestore) + 1, engine='numpy') == scalar
+
+def test_addressways_numpy_engine_fixture():
+    features = parse_shp_for_geom_and_tags('tests/fixtures/tl_2020_37143_edges.zip', address_only=True)
+    i, nodelist = compile_nodelist(features)
+    waylist = compile_waylist(features)
+
+    scalar = addressways(waylist, nodelist, i)
+    vectorised = addressways(waylist, nodelist, i, engine='numpy')
+
+    assert len(vectorised) == len(scalar)
+    for row, expected in zip(vectorised, scalar):
+        assert row.keys() == expected.keys()
+        assert {k: v for k, v in row.items() if k != 'geometry'} == \
+               {k: v for k, v in expected.items() if k != 'geometry'}
+
+        coords = [float(c) for c in re.findall(r'[-0-9.]+', row['geometry'])]
+        expected_coords = [float(c) for c in re.findall(r'[-0-9.]+', expected['geometry'])]
+        assert coords == pytest.approx(expected_coords, abs=1.0000001e-6)
+
+def test_compile_nodestore_and_waylist(features):
+    coords = [point for geom, _tags in features for point in geom]
+    nodestore, waylist = compile_nodestore_and_waylist(coords, [0, 2, 4, 6], [tags for _geom, tags in features])
+
+    assert [[list(segment) for segment in segments] for segments in waylist.values()] == [
+        [[0, 1]],
+        [[2, 1, 3]]
+    ]
+
+    i, nodelist = compile_nodelist(features)
+    assert addressways(waylist, nodestore, len(nodestore) + 1) == \
+        addressways(compile_waylist(features), nodelist, i)
+    assert addressways(waylist, nodestore, len(nodestore) + 1, engine='numpy') == \
+        addressways(compile_waylist(features), nodelist, i)
+
+def test_shape_to_csv_nodestore(tmp_path):
+    shape_to_csv('tests/fixtures/tl_2020_37143_edges.zip', tmp_path / 'out.csv', nodestore=True, batched=True)
+
+    with open(tmp_path / 'out.csv', encoding='utf8') as file:
+        with open('tests/fixtures/expected_37143.csv', encoding='utf8') as expected:
+            assert file.read() == expected.read()
+
+def test_shape_to_csv_tlid(tmp_path):
+    shape_to_csv('tests/fixtures/tl_2020_37143_edges.zip', tmp_path / 'out.csv', tlid=True)
+
+    with open(tmp_path / 'out.csv', encoding='utf8') as file:
+        lines = file.read().splitlines()
+    with open('tests/fixtures/expected_37143.csv', encoding='utf8') as expected:
+        expected_lines = expected.read().splitlines()
+
+    assert lines[0] == 'tlid;' + expected_lines[0]
+    assert all(re.match(r'^\d+;', line) for line in lines[1:])
+    assert [line.split(';', 1)[1] for line in lines[1:]] == expected_lines[1:]
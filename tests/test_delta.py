@@ -0,0 +1,47 @@
+from lib.delta import write_delta, split_into_buckets, read_bucket, DELTA_HEADER
+
+HEADER = 'tlid;from;to;interpolation;street;city;state;postcode;geometry\r\n'
+
+def write_csv(filename, rows):
+    with open(filename, 'w', encoding='utf8', newline='') as file:
+        file.write(HEADER + ''.join(row + '\r\n' for row in rows))
+
+def test_split_into_buckets(tmp_path):
+    (tmp_path / 'in').mkdir()
+    write_csv(tmp_path / 'in' / '37001.csv', ['1;1;9;odd;A;X;NC;27944;LINESTRING(0 0,1 1)'])
+    write_csv(tmp_path / 'in' / '37003.csv', ['22;2;8;even;B;X;NC;27944;LINESTRING(0 0,1 1)',
+                                          '1;2;8;even;A;X;NC;27944;LINESTRING(0 0,1 1)'])
+
+    assert split_into_buckets(tmp_path / 'in', tmp_path / 'buckets', 1) == 3
+    assert read_bucket(tmp_path / 'buckets' / '0.csv') == {
+        1: ['1;1;9;odd;A;X;NC;27944;LINESTRING(0 0,1 1)', '1;2;8;even;A;X;NC;27944;LINESTRING(0 0,1 1)'],
+        22: ['22;2;8;even;B;X;NC;27944;LINESTRING(0 0,1 1)']
+    }
+
+def test_write_delta(tmp_path):
+    write_csv(tmp_path / 'old.csv', [
+        '1;1;9;odd;A;X;NC;27944;LINESTRING(0 0,1 1)',
+        '1;2;8;even;A;X;NC;27944;LINESTRING(0 0,1 1)',
+        '2;1;9;odd;B;X;NC;27944;LINESTRING(0 0,1 1)',
+        '3;1;9;odd;C;X;NC;27944;LINESTRING(0 0,1 1)'
+    ])
+    write_csv(tmp_path / 'new.csv', [
+        # same rows in a different order
+        '1;2;8;even;A;X;NC;27944;LINESTRING(0 0,1 1)',
+        '1;1;9;odd;A;X;NC;27944;LINESTRING(0 0,1 1)',
+        '3;1;11;odd;C;X;NC;27944;LINESTRING(0 0,1 1)',
+        '4;1;9;odd;D;X;NC;27944;LINESTRING(0 0,1 1)'
+    ])
+    (tmp_path / 'tmp').mkdir()
+
+    counts = write_delta(tmp_path / 'old.csv', tmp_path / 'new.csv', tmp_path / 'delta.csv', tmp_path / 'tmp', 4)
+    assert counts == {'added': 1, 'removed': 1, 'changed': 1, 'unchanged': 1}
+
+    with open(tmp_path / 'delta.csv', encoding='utf8') as file:
+        header, *rows = file.read().splitlines()
+    assert header == DELTA_HEADER
+    assert sorted(rows) == [
+        'added;4;1;9;odd;D;X;NC;27944;LINESTRING(0 0,1 1)',
+        'changed;3;1;11;odd;C;X;NC;27944;LINESTRING(0 0,1 1)',
+        'removed;2;1;9;odd;B;X;NC;27944;LINESTRING(0 0,1 1)'
+    ]
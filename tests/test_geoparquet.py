@@ -0,0 +1,37 @@
+import json
+import re
+import struct
+import pytest
+from lib.convert import shape_to_csv
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet
+
+def wkb_coordinates(wkb):
+    byte_order, geometry_type, count = struct.unpack_from('<BII', wkb)
+    assert (byte_order, geometry_type) == (1, 2)
+    return list(struct.unpack_from('<%dd' % (2 * count), wkb, 9))
+
+def test_shape_to_geoparquet(tmp_path):
+    shape_to_csv('tests/fixtures/tl_2020_37143_edges.zip', str(tmp_path / 'out.parquet'),
+                 tlid=True, output_format='parquet')
+    table = pyarrow.parquet.read_table(tmp_path / 'out.parquet')
+
+    with open('tests/fixtures/expected_37143.csv', encoding='utf8') as expected:
+        expected_lines = expected.read().splitlines()[1:]
+    assert table.num_rows == len(expected_lines)
+
+    schema = table.schema
+    assert schema.field('tlid').type == pyarrow.int64()
+    assert schema.field('from').type == pyarrow.int64()
+    assert schema.field('street').type == pyarrow.string()
+    assert schema.field('geometry').type == pyarrow.binary()
+    assert json.loads(schema.metadata[b'geo'])['columns']['geometry']['encoding'] == 'WKB'
+
+    rows = table.to_pylist()
+    for row, line in zip(rows, expected_lines):
+        fields = line.split(';')
+        assert str(row['from']) == fields[0] and str(row['to']) == fields[1]
+        assert row['postcode'] == (fields[6] or None)
+        wkt_coordinates = [float(number) for number in re.findall(r'-?[\d.]+', fields[7])]
+        assert wkb_coordinates(row['geometry']) == wkt_coordinates
@@ -1,5 +1,7 @@
-from lib.helpers import round_point, adjacent, glom, check_if_integers, \
-                        interpolation_type, create_wkt_linestring
+import random
+from lib.helpers import round_point, adjacent, glom, glom_once, glom_all, check_if_integers, \
+                        interpolation_type, create_wkt_linestring, create_wkb_linestring
+import struct
 
 def test_round_point():
     assert round_point([1.0, 1.0]) == (1.0, 1.0)
@@ -42,3 +44,63 @@ def test_create_wkt_linestring():
     ]
     assert(create_wkt_linestring(segment)) == \
         'LINESTRING(200.000000 100.000000,201.000000 101.000000)'
+
+def create_wkt_linestring_reference(segment):
+    # The original implementation formatting one vertex at a time
+    coord_pairs = []
+    for _i, point in segment:
+        coord_pairs.append( "%f %f" % (point[1], point[0]) )
+    return 'LINESTRING(' + ','.join(coord_pairs) + ')'
+
+def test_create_wkt_linestring_same_as_per_vertex():
+    special = [0.0, -0.0, 0.0000005, -0.0000005, 0.0000004, -0.0000004, 1.0000005, -76.5220445,
+               2.675, 123456789.123456789, -180.0, 1e-9, -1e-9]
+    segments = [[], [(1, (-0.0, 0.0000004))], list(enumerate(zip(special, special[::-1])))]
+    rng = random.Random(5)
+    for _ in range(200):
+        segments.append([(i, (rng.uniform(-90, 90), rng.uniform(-180, 180))) for i in range(rng.randint(1, 50))])
+        segments.append([(i, (round(rng.uniform(-1, 1), 7), rng.choice(special))) for i in range(rng.randint(1, 5))])
+
+    for segment in segments:
+        assert create_wkt_linestring(segment) == create_wkt_linestring_reference(segment)
+
+def test_create_wkb_linestring():
+    segment = [
+        (1, (100.12345678, 200)),
+        (2, (101, 201.5))
+    ]
+    assert create_wkb_linestring(segment) == \
+        struct.pack('<BII4d', 1, 2, 2, 200.0, 100.123457, 201.5, 101.0)
+    assert create_wkb_linestring(segment, 4326) == \
+        struct.pack('<BIII4d', 1, 0x20000002, 4326, 2, 200.0, 100.123457, 201.5, 101.0)
+
+def glom_all_reference( segments ):
+    # The original quadratic implementation
+    unsorted = segments
+    chunks = []
+    while unsorted != []:
+        chunk, unsorted = glom_once( unsorted )
+        chunks.append( chunk )
+    return chunks
+
+def test_glom_all():
+    line1 = [[1,1], [1,2], [1,3]]
+    line2 = [[2,2], [2,3], [1,3]]
+    line3 = [[5,5], [6,6]]
+    line4 = [[0,0], [1,1]]
+
+    assert glom_all([line1, line2, line3, line4]) == [
+        [[0,0], [1,1], [1,2], [1,3], [2,3], [2,2]],
+        [[5,5], [6,6]]
+    ]
+
+def test_glom_all_same_as_glom_once():
+    rnd = random.Random(42)
+    for _ in range(500):
+        # few distinct points, so there are loops, branches and reversed pieces
+        nodes = [(rnd.randint(0, 6) + 0.000000001 * rnd.random(), rnd.randint(0, 6)) for _ in range(8)]
+        segments = []
+        for _ in range(rnd.randint(0, 12)):
+            segments.append([nodes[rnd.randrange(8)] for _ in range(rnd.randint(1, 4))])
+
+        assert glom_all(segments) == glom_all_reference(segments)
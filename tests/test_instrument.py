@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from lib.instrument import Instrumentation, counted, summarize, append_report, read_report, reset_peak_rss, \
+                            current_rss_kb
+
+def test_instrumentation(tmp_path):
+    instrumentation = Instrumentation(county='37143')
+    with instrumentation.stage('parse') as counts:
+        counts['features'] = len(list(counted(range(5), counts, 'seen')))
+    with instrumentation.stage('write') as counts:
+        sum(range(100000))
+
+    record = instrumentation.record()
+    assert record['county'] == '37143'
+    assert [stage['stage'] for stage in record['stages']] == ['parse', 'write']
+    assert record['stages'][0]['counts'] == {'seen': 5, 'features': 5}
+    assert record['peak_rss_kb'] > 0
+    assert record['wall'] >= record['stages'][1]['wall'] >= 0
+
+    append_report(tmp_path / 'report.jsonl', record)
+    append_report(tmp_path / 'report.jsonl', record)
+    assert read_report(tmp_path / 'report.jsonl') == [record, record]
+
+def test_peak_rss_per_stage():
+    if not reset_peak_rss():
+        pytest.skip("peak RSS can't be reset on this system")
+
+    instrumentation = Instrumentation()
+    with instrumentation.stage('large'):
+        large = np.ones(50 * 1024 * 1024 // 8)
+        del large
+    with instrumentation.stage('small'):
+        small = np.ones(1024)
+        del small
+
+    large_stage, small_stage = instrumentation.stages
+    assert large_stage['peak_rss_kb'] - small_stage['peak_rss_kb'] > 40 * 1024
+
+def test_peak_rss_overlapping_stages():
+    if not reset_peak_rss():
+        pytest.skip("peak RSS can't be reset on this system")
+
+    # a stage of another county starting in the middle doesn't lose the peak
+    compute = Instrumentation(reset_peak=False)
+    read = Instrumentation(reset_peak=False)
+    before = current_rss_kb()
+    with compute.stage('addressways'):
+        large = np.ones(50 * 1024 * 1024 // 8)
+        del large
+        with read.stage('parse'):
+            pass
+
+    assert compute.stages[0]['peak_rss_kb'] - before > 40 * 1024
+
+def test_summarize():
+    def record(county, parse, write):
+        return {'county': county, 'wall': parse + write, 'cpu': parse + write, 'peak_rss_kb': 2048,
+                'stages': [{'stage': 'parse', 'wall': parse, 'cpu': parse, 'peak_rss_kb': 2048, 'counts': {}},
+                           {'stage': 'write', 'wall': write, 'cpu': write, 'peak_rss_kb': 1024, 'counts': {}}]}
+
+    lines = summarize([record('37143', 1.0, 2.0), record('06037', 30.0, 4.0)], top=1)
+    assert lines[1].split() == ['parse', '31.0s', '31.0s', '2', 'MB', '06037', '(30.0s)']
+    assert lines[2].split() == ['write', '6.0s', '6.0s', '1', 'MB', '06037', '(4.0s)']
+    assert lines[5].split() == ['06037', '34.0s', '34.0s', '2', 'MB', 'parse', '(30.0s)']
+    assert len(lines) == 6
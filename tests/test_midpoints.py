@@ -0,0 +1,45 @@
+import pytest
+from lib.midpoints import read_midpoints_mmap
+from lib.postcodes import read_midpoints
+
+def assert_same_as_csv(filename):
+    expected = read_midpoints(open(filename, encoding='utf8'))
+    result = read_midpoints_mmap(filename)
+    assert sorted(result) == sorted(expected)
+    for postcode, points in expected.items():
+        assert result[postcode].tolist() == points
+
+def test_read_midpoints_mmap_fixture():
+    assert_same_as_csv('tests/fixtures/expected_37143.csv')
+
+def test_read_midpoints_mmap(tmp_path):
+    filename = tmp_path / 'test.csv'
+    with open(filename, 'w', encoding='utf8', newline='') as file:
+        file.write(
+            'from;to;interpolation;street;city;state;postcode;geometry\r\n'
+            '1;9;odd;A St, B;X;NC;27944;LINESTRING(-76.1 36.1,-76.2 36.2,-76.3 36.3)\r\n'
+            'from;to;interpolation;street;city;state;postcode;geometry\n'
+            '\n'
+            '2;8;even;A St;X;NC;;LINESTRING(-76.1 36.1,-76.2 36.2)\n'
+            '2;8;even;A St;X;NC;2794;LINESTRING(-76.1 36.1,-76.2 36.2)\n'
+            '2;8;even;A St;X;NC;27944;LINESTRING(-76.1 36.1,-76.2 36.2)\n'
+            '2;8;even;A St;X;NC;00535;LINESTRING(-76.1 36.1,-76.2 36.2,-76.3 36.3,-76.4 36.4)\n'
+            '2;8;even;A St;X;NC;00535;LINESTRING(-1 2)'
+        )
+    assert_same_as_csv(filename)
+    assert read_midpoints_mmap(filename)['00535'].tolist() == [[-76.3, 36.3], [-1.0, 2.0]]
+
+@pytest.mark.parametrize('line', [
+    '1;9;odd;"A;St";X;NC;27944;LINESTRING(-76.1 36.1)\n',
+    '1;9;odd;A St;X;NC;27944\n',
+    '1;9;odd;A St;X;NC;27944;LINESTRING(-76.1  36.1)\n',
+])
+def test_read_midpoints_mmap_falls_back(tmp_path, line):
+    filename = tmp_path / 'test.csv'
+    with open(filename, 'w', encoding='utf8') as file:
+        file.write('from;to;interpolation;street;city;state;postcode;geometry\n' + line)
+    assert read_midpoints_mmap(filename) is None
+
+def test_read_midpoints_mmap_empty(tmp_path):
+    (tmp_path / 'empty.csv').touch()
+    assert read_midpoints_mmap(tmp_path / 'empty.csv') == {}
@@ -0,0 +1,29 @@
+from lib.nodestore import compile_nodestore
+from lib.convert import compile_nodelist
+from lib.helpers import round_point
+
+def test_compile_nodestore():
+    coords = [(1.1, 2.1), (1.2, 2.2), (1.2, 2.1), (1.2000000000001, 2.2), (1.2, 2.3)]
+    nodestore, node_indices = compile_nodestore(coords)
+
+    assert len(nodestore) == 4
+    assert node_indices.tolist() == [0, 1, 2, 1, 3]
+    assert nodestore.lat.tolist() == [2.1, 2.2, 2.1, 2.3]
+    assert nodestore.lon.tolist() == [1.1, 1.2, 1.2, 1.2]
+
+def test_nodestore_same_as_nodelist():
+    coords = [(-76.522227, 36.329937), (-76.52193799999999, 36.330121999999996),
+              (-76.522227, 36.329937), (-76.521714, 36.330247)]
+    nodestore, node_indices = compile_nodestore(coords)
+    _i, nodelist = compile_nodelist([(coords, {})])
+
+    assert [nodestore[index] for index in range(len(nodestore))] == list(nodelist.values())
+    assert [nodestore[index] for index in node_indices] == [nodelist[round_point(point)] for point in coords]
+
+def test_segments_arrays():
+    nodestore, _node_indices = compile_nodestore([(1.1, 2.1), (1.2, 2.2), (1.2, 2.3)])
+    ids, lats, lons = nodestore.segments_arrays([[2, 0], [1, 2]])
+
+    assert ids.tolist() == [3, 1, 2, 3]
+    assert lats.tolist() == [2.3, 2.1, 2.2, 2.3]
+    assert lons.tolist() == [1.2, 1.1, 1.2, 1.2]
@@ -0,0 +1,45 @@
+import gzip
+import pytest
+from lib.output import write_csv, open_csv, csv_filenames, SingleFile, header_bytes
+
+FIELDNAMES = ['from', 'to', 'street']
+ROWS = [{'from': '1', 'to': '9', 'street': 'A St'}, {'from': '2', 'to': '8', 'street': 'B;St'}]
+EXPECTED = 'from;to;street\r\n1;9;A St\r\n2;8;"B;St"\r\n'
+
+def test_write_csv(tmp_path):
+    assert write_csv(str(tmp_path / 'out.csv'), iter(ROWS), FIELDNAMES) == 2
+    with open(tmp_path / 'out.csv', 'rb') as file:
+        assert file.read() == EXPECTED.encode('utf8')
+
+def test_write_csv_gzip(tmp_path):
+    write_csv(str(tmp_path / 'out.csv.gz'), ROWS, FIELDNAMES, 'gzip')
+    with gzip.open(tmp_path / 'out.csv.gz', 'rb') as file:
+        assert file.read() == EXPECTED.encode('utf8')
+    with open(tmp_path / 'out.csv.gz', 'rb') as file:
+        assert file.read().startswith(header_bytes(FIELDNAMES, 'gzip'))
+
+def test_write_csv_zstd(tmp_path):
+    pytest.importorskip('zstandard')
+    write_csv(str(tmp_path / 'out.csv.zst'), ROWS, FIELDNAMES, 'zstd')
+    with open_csv(str(tmp_path / 'out.csv.zst')) as file:
+        assert file.read() == EXPECTED.replace('\r\n', '\n')
+
+def test_write_csv_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        write_csv(str(tmp_path / 'out.csv.xz'), ROWS, FIELDNAMES, 'xz')
+
+@pytest.mark.parametrize('compression, extension', [(None, '.csv'), ('gzip', '.csv.gz')])
+def test_single_file(tmp_path, compression, extension):
+    write_csv(str(tmp_path / ('37001' + extension)), ROWS[:1], FIELDNAMES, compression)
+    write_csv(str(tmp_path / ('37143' + extension)), ROWS[1:], FIELDNAMES, compression)
+    for other in ('other.txt', 'all' + extension, '37145' + extension + '.tmp', '37145.csv.xz'):
+        (tmp_path / other).touch()
+    assert csv_filenames(tmp_path) == [str(tmp_path / ('37001' + extension)), str(tmp_path / ('37143' + extension))]
+
+    single_file = SingleFile(str(tmp_path / ('all' + extension)), FIELDNAMES, compression)
+    for filename in csv_filenames(tmp_path):
+        single_file.append(filename)
+    single_file.close()
+
+    with open_csv(str(tmp_path / ('all' + extension))) as file:
+        assert file.read() == EXPECTED.replace('\r\n', '\n')
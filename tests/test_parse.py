@@ -1,4 +1,7 @@
-from lib.parse import parse_shp_for_geom_and_tags
+import struct
+import numpy as np
+from lib.parse import parse_shp_for_geom_and_tags, gdal_filename, iter_shp_batches, \
+                      linestrings_from_wkb, open_layer, _iter_arrow_batches, _iter_feature_batches, TAG_FIELDS
 
 def test_parse_shp_for_geom_and_tags():
     shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
@@ -46,3 +49,115 @@ def test_parse_shp_for_geom_and_tags():
             'tiger:zip_right': '27919'
         }
     )
+
+def test_parse_shp_for_geom_and_tags_from_zip():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    zipfile = 'tests/fixtures/tl_2020_37143_edges.zip'
+
+    assert parse_shp_for_geom_and_tags(zipfile) == parse_shp_for_geom_and_tags(shapefile)
+
+def test_gdal_filename():
+    assert gdal_filename('tiger/tl_2020_37143_edges.shp') == 'tiger/tl_2020_37143_edges.shp'
+    assert gdal_filename('/data/tl_2020_37143_edges.zip') == \
+        '/vsizip//data/tl_2020_37143_edges.zip/tl_2020_37143_edges.shp'
+
+def test_parse_shp_for_geom_and_tags_address_only():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    parsed = parse_shp_for_geom_and_tags(shapefile)
+    filtered = parse_shp_for_geom_and_tags(shapefile, address_only=True)
+
+    def has_address(tags):
+        return ('tiger:lfromadd' in tags and 'tiger:ltoadd' in tags) or \
+               ('tiger:rfromadd' in tags and 'tiger:rtoadd' in tags)
+
+    assert 0 < len(filtered) < len(parsed)
+    assert filtered == [feature for feature in parsed if has_address(feature[1])]
+
+def test_parse_shp_for_geom_and_tags_fields():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    parsed = parse_shp_for_geom_and_tags(shapefile, fields=['TLID', 'FULLNAME'])
+
+    assert(parsed[0][1]) == {
+        'tiger:way_id': 18401089,
+        'name': 'Hickory Cross Rd'
+    }
+
+def test_parse_shp_for_geom_and_tags_batched():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges.zip'
+
+    assert parse_shp_for_geom_and_tags(shapefile, batched=True) == \
+        parse_shp_for_geom_and_tags(shapefile, fields=TAG_FIELDS)
+
+def test_iter_shp_batches():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges.zip'
+    batches = list(iter_shp_batches(shapefile, address_only=True, batch_size=1000))
+
+    assert [len(batch) for batch in batches] == [1000, 663]
+    assert batches[0].coords.shape == (batches[0].offsets[-1], 2)
+    assert [feature for batch in batches for feature in batch.features()] == \
+        parse_shp_for_geom_and_tags(shapefile, address_only=True)
+
+class ArrowLayer:
+    """
+    Stands in for an OGR layer of GDAL >= 3.6: the features of a real one
+    as the dicts of arrays of GetArrowStreamAsNumPy
+    """
+    def __init__(self, po_layer):
+        layer_definition = po_layer.GetLayerDefn()
+        self.features = []
+        po_feature = po_layer.GetNextFeature()
+        while po_feature:
+            fields = {fieldname: po_feature.GetField(layer_definition.GetFieldIndex(fieldname))
+                      for fieldname in TAG_FIELDS}
+            points = [point[:2] for point in po_feature.GetGeometryRef().GetPoints()]
+            wkb = b'\x01\x02\x00\x00\x00' + struct.pack('<I', len(points)) \
+                + b''.join(struct.pack('<2d', *point) for point in points)
+            self.features.append((fields, wkb))
+            po_feature = po_layer.GetNextFeature()
+
+    def GetGeometryColumn(self): # pylint: disable=invalid-name
+        return ''
+
+    def GetArrowStreamAsNumPy(self, options): # pylint: disable=invalid-name
+        assert 'USE_MASKED_ARRAYS=NO' in options
+        [batch_size] = [int(option.split('=')[1]) for option in options if option.startswith('MAX_FEATURES')]
+        for start in range(0, len(self.features), batch_size):
+            features = self.features[start:start + batch_size]
+            batch = {'wkb_geometry': np.array([wkb for _fields, wkb in features], dtype=object),
+                     'TLID': np.array([fields['TLID'] for fields, _wkb in features], dtype=np.int64)}
+            for fieldname in TAG_FIELDS[1:]:
+                values = [fields[fieldname] for fields, _wkb in features]
+                if fieldname in ('FULLNAME', 'ZIPL', 'ZIPR'):
+                    # string columns may come as bytes
+                    values = [value.encode('utf8') if value is not None else None for value in values]
+                batch[fieldname] = np.array(values, dtype=object)
+            yield batch
+
+def test_iter_arrow_batches():
+    shapefile = 'tests/fixtures/tl_2020_37143_edges.zip'
+    # keep the data sources, their layers are only valid as long as they exist
+    arrow_ds, arrow_layer = open_layer(shapefile, True, TAG_FIELDS)
+    arrow_batches = list(_iter_arrow_batches(ArrowLayer(arrow_layer), 1000))
+    feature_ds, feature_layer = open_layer(shapefile, True, TAG_FIELDS)
+    feature_batches = list(_iter_feature_batches(feature_layer, 1000))
+    del arrow_ds, feature_ds
+
+    assert [len(batch) for batch in arrow_batches] == [1000, 663]
+    for arrow_batch, feature_batch in zip(arrow_batches, feature_batches):
+        assert np.array_equal(arrow_batch.coords, feature_batch.coords)
+        assert arrow_batch.offsets.tolist() == feature_batch.offsets.tolist()
+        assert arrow_batch.columns['TLID'].dtype == np.int64
+        assert arrow_batch.columns['TLID'].tolist() == feature_batch.columns['TLID'].tolist()
+        for fieldname in TAG_FIELDS[1:]:
+            assert arrow_batch.columns[fieldname] == feature_batch.columns[fieldname]
+        assert list(arrow_batch.features()) == list(feature_batch.features())
+
+def test_linestrings_from_wkb():
+    wkb_geometries = [
+        b'\x01\x02\x00\x00\x00' + struct.pack('<I4d', 2, -76.5, 36.3, -76.4, 36.2),
+        b'\x01\x02\x00\x00\x00' + struct.pack('<I2d', 1, -76.3, 36.1)
+    ]
+    coords, offsets = linestrings_from_wkb(wkb_geometries)
+
+    assert coords.tolist() == [[-76.5, 36.3], [-76.4, 36.2], [-76.3, 36.1]]
+    assert offsets.tolist() == [0, 2, 3]
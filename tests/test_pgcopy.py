@@ -0,0 +1,52 @@
+import gzip
+import struct
+from lib.pgcopy import write_pgcopy, PGCOPY_SIGNATURE
+
+FIELDNAMES = ['from', 'to', 'street', 'geometry']
+ROWS = [{'from': 1, 'to': 9, 'street': 'A St', 'geometry': b'\x01\x02'},
+        {'from': 2, 'to': 8, 'street': 'Bäume;St', 'geometry': b''}]
+
+def read_pgcopy(data):
+    """ The rows of a binary COPY stream as lists of raw field values """
+    assert data.startswith(PGCOPY_SIGNATURE)
+    position = len(PGCOPY_SIGNATURE)
+    flags, extension = struct.unpack_from('>ii', data, position)
+    assert (flags, extension) == (0, 0)
+    position += 8
+
+    rows = []
+    while True:
+        field_count, = struct.unpack_from('>h', data, position)
+        position += 2
+        if field_count == -1:
+            assert position == len(data)
+            return rows
+        row = []
+        for _ in range(field_count):
+            length, = struct.unpack_from('>i', data, position)
+            position += 4
+            row.append(None if length == -1 else data[position:position + length])
+            position += max(length, 0)
+        rows.append(row)
+
+def test_write_pgcopy(tmp_path):
+    assert write_pgcopy(str(tmp_path / 'out.pgcopy'), iter(ROWS), FIELDNAMES) == 2
+    with open(tmp_path / 'out.pgcopy', 'rb') as file:
+        rows = read_pgcopy(file.read())
+
+    assert rows == [
+        [struct.pack('>q', 1), struct.pack('>q', 9), b'A St', b'\x01\x02'],
+        [struct.pack('>q', 2), struct.pack('>q', 8), 'Bäume;St'.encode('utf8'), b'']
+    ]
+
+def test_write_pgcopy_null_and_gzip(tmp_path):
+    write_pgcopy(str(tmp_path / 'out.pgcopy.gz'), [{'from': 1, 'to': 3}], FIELDNAMES, 'gzip')
+    with gzip.open(tmp_path / 'out.pgcopy.gz', 'rb') as file:
+        rows = read_pgcopy(file.read())
+
+    assert rows == [[struct.pack('>q', 1), struct.pack('>q', 3), None, None]]
+
+def test_write_pgcopy_empty(tmp_path):
+    assert write_pgcopy(str(tmp_path / 'out.pgcopy'), [], FIELDNAMES) == 0
+    with open(tmp_path / 'out.pgcopy', 'rb') as file:
+        assert read_pgcopy(file.read()) == []
@@ -0,0 +1,146 @@
+import io
+import os
+import random
+from statistics import mean, median
+from math import sqrt
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import lib.postcodes
+from lib.postcodes import read_midpoints, read_midpoints_directory, calculate_centroids, write_centroids, \
+                          exact_mean, MidpointSpool, calculate_centroids_out_of_core
+
+def centroids_csv(postcode_summary):
+    out = io.StringIO()
+    write_centroids(out, calculate_centroids(postcode_summary))
+    return out.getvalue()
+
+def expected_centroids():
+    with open('tests/fixtures/expected_us_postcodes.csv', encoding='utf8') as file:
+        return file.read()
+
+def test_read_midpoints():
+    csv_file = io.StringIO(
+        'from;to;interpolation;street;city;state;postcode;geometry\n'
+        '1;9;odd;A St;X;NC;27944;LINESTRING(-76.1 36.1,-76.2 36.2,-76.3 36.3)\n'
+        'from;to;interpolation;street;city;state;postcode;geometry\n'
+        '2;8;even;A St;X;NC;;LINESTRING(-76.1 36.1,-76.2 36.2)\n'
+        '2;8;even;A St;X;NC;27944;LINESTRING(-76.1 36.1,-76.2 36.2)\n'
+    )
+    assert read_midpoints(csv_file) == {'27944': [[-76.2, 36.2], [-76.2, 36.2]]}
+
+def test_calculate_centroids():
+    points = [[-76.0, 36.0], [-76.2, 36.2], [-76.1, 36.1], [-70.0, 30.0]]
+    assert list(calculate_centroids({'27944': points, '00001': [[1.0, 2.0]]})) == [
+        ('00001', 2.0, 1.0),
+        ('27944', 36.1, -76.1)
+    ]
+    # too many outliers
+    assert not list(calculate_centroids({'27944': [[0.0, 0.0], [0.0, 0.0], [5.0, 5.0], [5.0, 5.0]]}))
+
+def test_centroids_of_fixture():
+    with open('tests/fixtures/expected_37143.csv', encoding='utf8') as csv_file:
+        assert centroids_csv(read_midpoints(csv_file)) == expected_centroids()
+
+def test_centroids_of_directory(tmp_path):
+    # Split the county in three, every postcode ends up in several files
+    with open('tests/fixtures/expected_37143.csv', encoding='utf8') as csv_file:
+        header, *lines = csv_file.readlines()
+    for i in range(3):
+        with open(tmp_path / ('3714%d.csv' % i), 'w', encoding='utf8') as file:
+            file.writelines([header] + lines[i::3])
+
+    assert centroids_csv(read_midpoints_directory(tmp_path, workers=2)) == expected_centroids()
+
+def calculate_centroids_reference(postcode_summary):
+    """ The original pure Python version """
+    def dist(p1, p2):
+        return sqrt((p1[0]-p2[0])**2+(p1[1]-p2[1])**2)
+
+    for postcode in sorted(postcode_summary):
+        points = postcode_summary[postcode]
+        centroid = [median(p) for p in zip(*points)]
+        for mxd in [0.1, 0.3, 0.5, 0.9]:
+            filtered = [p for p in points if dist(centroid, p) < mxd]
+            if len(filtered) < 0.7 * len(points):
+                continue
+            points = filtered
+            centroid = [mean(p) for p in zip(*points)]
+            yield postcode, round(centroid[1], 6), round(centroid[0], 6)
+            break
+
+def test_calculate_centroids_same_as_reference():
+    rnd = random.Random(42)
+    postcode_summary = {}
+    for postcode in range(300):
+        center = (rnd.uniform(-160, -65), rnd.uniform(18, 65))
+        spread = rnd.choice([0.01, 0.1, 0.4, 1.0])
+        postcode_summary['%05d' % postcode] = [
+            [round(center[0] + rnd.gauss(0, spread), 6), round(center[1] + rnd.gauss(0, spread), 6)]
+            for _ in range(rnd.randint(1, 200))
+        ]
+
+    assert list(calculate_centroids(postcode_summary)) == \
+        list(calculate_centroids_reference(postcode_summary))
+
+def test_exact_mean():
+    rnd = random.Random(42)
+    for _ in range(100):
+        values = [round(rnd.uniform(-180, 180), 6) for _ in range(rnd.randint(1, 1000))]
+        assert exact_mean(np.array(values)) == mean(values)
+
+    # not representable as integers, falls back to statistics.mean
+    values = [0.1, 1e-9, 2.5]
+    assert exact_mean(np.array(values)) == mean(values)
+
+def test_midpoint_spool(tmp_path):
+    rnd = random.Random(42)
+    postcode_summary = {}
+    spool = MidpointSpool(tmp_path, 2000)
+    for _ in range(3000):
+        postcode = rnd.choice(['00535', '27944', '27946', '90001', '99999'])
+        point = [round(rnd.uniform(-77, -76), 6), round(rnd.uniform(36, 37), 6)]
+        postcode_summary.setdefault(postcode, []).append(point)
+        spool.add(postcode, point)
+    spool.add_points('27919', np.array([[-76.5, 36.3], [-76.6, 36.4]]))
+    postcode_summary['27919'] = [[-76.5, 36.3], [-76.6, 36.4]]
+
+    assert spool.spilled_points > 0
+    assert sorted(os.listdir(tmp_path)) == ['midpoints-00.bin', 'midpoints-27.bin',
+                                            'midpoints-90.bin', 'midpoints-99.bin']
+
+    assert list(calculate_centroids_out_of_core(spool)) == list(calculate_centroids(postcode_summary))
+    assert os.listdir(tmp_path) == []
+
+def test_centroids_of_directory_out_of_core(tmp_path):
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'tmp').mkdir()
+    with open('tests/fixtures/expected_37143.csv', encoding='utf8') as csv_file:
+        header, *lines = csv_file.readlines()
+    for i in range(3):
+        with open(tmp_path / 'in' / ('3714%d.csv' % i), 'w', encoding='utf8') as file:
+            file.writelines([header] + lines[i::3])
+
+    spool = read_midpoints_directory(tmp_path / 'in', workers=2, spool=MidpointSpool(tmp_path / 'tmp', 1000))
+    out = io.StringIO()
+    write_centroids(out, calculate_centroids_out_of_core(spool))
+    assert out.getvalue() == expected_centroids()
+
+def test_read_midpoints_directory_bounded(tmp_path, monkeypatch):
+    for i in range(20):
+        (tmp_path / ('%05d.csv' % i)).touch()
+
+    read = []
+    merged = []
+    def read_midpoints_file(filename):
+        assert len(read) - len(merged) < 2 * 2
+        read.append(filename)
+        return {os.path.basename(filename): np.zeros((1, 2))}
+
+    class Spool:
+        def add_points(self, postcode, _points):
+            merged.append(postcode)
+
+    monkeypatch.setattr(lib.postcodes, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(lib.postcodes, 'read_midpoints_file', read_midpoints_file)
+    read_midpoints_directory(tmp_path, workers=2, spool=Spool())
+    assert sorted(merged) == ['%05d.csv' % i for i in range(20)]
@@ -1,5 +1,41 @@
-from lib.project import unproject
+import lib.project
+from lib.project import unproject, unproject_points
+from lib.parse import parse_shp_for_geom_and_tags
 
 def test_unproject():
     # This test fails on my MacOS, no idea why, must be my local python setup
     assert(unproject([-76.521714, 36.330247])) == (36.330247, -76.521714)
+
+def test_unproject_points():
+    points = [(-76.521714, 36.330247), (-76.52193799999999, 36.330121999999996)]
+
+    assert unproject_points(points).tolist() == [list(unproject(point)) for point in points]
+    assert unproject_points([]).shape == (0, 2)
+
+def test_unproject_points_fast_path(monkeypatch):
+    shapefile = 'tests/fixtures/tl_2020_37143_edges/tl_2020_37143_edges.shp'
+    points = [point for geom, _tags in parse_shp_for_geom_and_tags(shapefile) for point in geom]
+    expected = [list(unproject(point)) for point in points]
+    # NAD83 to WGS84 is a null transformation
+    assert lib.project.TRANSFORM_IS_NOOP
+
+    calls = []
+    class Transformer:
+        def __init__(self, transformer):
+            self.transformer = transformer
+        def TransformPoints(self, points): # pylint: disable=invalid-name
+            calls.append(len(points))
+            return self.transformer.TransformPoints(points)
+    monkeypatch.setattr(lib.project, 'transformer', Transformer(lib.project.transformer))
+
+    monkeypatch.setattr(lib.project, 'TRANSFORM_IS_NOOP', False)
+    transformed = unproject_points(points)
+    assert calls == [len(points)]
+
+    monkeypatch.setattr(lib.project, 'TRANSFORM_IS_NOOP', True)
+    swapped = unproject_points(points)
+    assert calls == [len(points)]
+
+    # Byte-identical, not only equal when printed with 6 decimals
+    assert transformed.tobytes() == swapped.tobytes()
+    assert transformed.tolist() == expected
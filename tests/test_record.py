@@ -0,0 +1,47 @@
+import itertools
+from collections import Counter
+from lib.helpers import check_if_integers, interpolation_type
+from lib.record import AddressRecord, parse_range, range_interpolation, non_integer_summary
+
+VALUES = [None, '', '0', '1', '2', '13', '100', '101', '-3', ' 7', 'P99', '1-400', 100, 101]
+
+def test_parse_range():
+    non_integer = Counter()
+    assert parse_range('100', '198', non_integer) == (100, 198)
+    assert parse_range(None, '198', non_integer) is None
+    assert parse_range('', '198', non_integer) is None
+    assert parse_range('P99', '198', non_integer) is None
+    assert parse_range('2', '1-400', non_integer) is None
+    assert non_integer == Counter({'P99': 1, '1-400': 1})
+
+def test_same_as_check_if_integers_and_interpolation_type():
+    for this_from, this_to, other_from, other_to in itertools.product(VALUES, repeat=4):
+        this = parse_range(this_from, this_to)
+        other = parse_range(other_from, other_to)
+        assert (this is not None) == bool(check_if_integers([this_from, this_to]))
+        assert range_interpolation(this, other) == \
+            interpolation_type(this_from, this_to, other_from, other_to)
+
+def test_address_record():
+    tags = {'tiger:way_id': 7, 'name': 'Main St', 'tiger:county': 'Perquimans', 'tiger:state': 'NC',
+            'tiger:lfromadd': '100', 'tiger:ltoadd': '198', 'tiger:rfromadd': 'P99', 'tiger:rtoadd': '199',
+            'tiger:zip_left': '27919'}
+    non_integer = Counter()
+    record = AddressRecord(tags, non_integer)
+
+    assert (record.tlid, record.name, record.zip_left, record.zip_right) == (7, 'Main St', '27919', None)
+    assert record.left and not record.right
+    assert (record.lrange, record.rrange) == ((100, 198), None)
+    assert record.linterpolation == 'all'
+    assert non_integer == Counter({'P99': 1})
+
+    # interned, so equal strings of different records are the same object
+    other = AddressRecord(dict(tags, name=''.join(['Main', ' St'])))
+    assert other.name is record.name
+    assert other == record and hash(other) == hash(record)
+    assert AddressRecord(dict(tags, **{'tiger:zip_right': ''})) != record
+
+def test_non_integer_summary():
+    assert non_integer_summary(Counter()) is None
+    assert non_integer_summary(Counter({'P99': 3, 'R501': 1})) == \
+        'Non integer addresses: 4, most common: P99 (3), R501 (1)'
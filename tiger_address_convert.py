@@ -10,46 +10,41 @@ BUGS:
 - It would be nice if the ends of the address ways were not pulled back from dead ends
 """
 
-import sys
-import csv
-
-from lib.parse import parse_shp_for_geom_and_tags
-from lib.convert import addressways, compile_nodelist, compile_waylist
-
-def shape_to_csv(shp_filename, csv_filename):
-    """
-    Main feature: reads a file, writes a file
-    """
-    print("parsing shpfile %s" % shp_filename)
-    parsed_features = parse_shp_for_geom_and_tags(shp_filename)
-
-    print("compiling nodelist")
-    i, nodelist = compile_nodelist(parsed_features)
-
-    print("compiling waylist")
-    waylist = compile_waylist(parsed_features)
-
-    print("preparing address ways")
-    csv_lines = addressways(waylist, nodelist, i)
-
-    print("writing %s" % csv_filename)
-    fieldnames = [
-        'from',
-        'to',
-        'interpolation',
-        'street',
-        'city',
-        'state',
-        'postcode',
-        'geometry'
-    ]
-    with open(csv_filename, 'w', encoding="utf8") as csv_file:
-        csv_writer = csv.DictWriter(csv_file, delimiter=';', fieldnames=fieldnames)
-        csv_writer.writeheader()
-        csv_writer.writerows(csv_lines)
-
-if len(sys.argv) < 3:
-    print("%s input.shp output.csv" % sys.argv[0])
-    sys.exit()
-
-shape_to_csv(sys.argv[1], sys.argv[2])
+import argparse
+
+from lib.convert import shape_to_csv
+from lib.instrument import Instrumentation, append_report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts a TIGER EDGES file into a CSV file with address ways')
+    parser.add_argument('input', help='input.shp or input.zip')
+    parser.add_argument('output', help='output.csv')
+    parser.add_argument('--streaming', action='store_true',
+                        help='write address ways while reading, keeping only one way in memory')
+    parser.add_argument('--batched', action='store_true',
+                        help='read the shapefile in columnar batches instead of feature by feature')
+    parser.add_argument('--engine', choices=('scalar', 'numpy'), default='scalar',
+                        help='compute the address way geometries point by point or vectorised')
+    parser.add_argument('--nodestore', action='store_true',
+                        help='keep nodes in compact arrays instead of a dict (uses less memory)')
+    parser.add_argument('--tlid', action='store_true',
+                        help='add the TLID of each edge as first column (needed by tiger_address_delta.py)')
+    parser.add_argument('--compress', choices=('gzip', 'zstd'),
+                        help='compress the output (zstd needs the zstandard package)')
+    parser.add_argument('--format', choices=('csv', 'parquet', 'pgcopy'), default='csv',
+                        help='output as CSV, GeoParquet (needs pyarrow) or PostgreSQL binary COPY')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='keep the parsed and compiled data in DIR and reuse it on later runs'
+                             ' instead of reading the shapefile again (implies --nodestore)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='append the time, CPU time, peak memory and item counts of each stage'
+                             ' to FILE as JSON lines')
+    args = parser.parse_args()
+
+    instrumentation = Instrumentation(input=args.input)
+    shape_to_csv(args.input, args.output, streaming=args.streaming, batched=args.batched,
+                 engine=args.engine, nodestore=args.nodestore, tlid=args.tlid,
+                 compression=args.compress, output_format=args.format, instrumentation=instrumentation,
+                 cache_dir=args.cache)
+    if args.report:
+        append_report(args.report, instrumentation.record())
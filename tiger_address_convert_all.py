@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+"""
+Converts all TIGER EDGES zip files of a directory into one CSV file per
+county, running several counties in parallel.
+"""
+
+import argparse
+import os
+import sys
+
+from lib.batch import convert_all
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('inpath', help='directory with tl_YYYY_SSCCC_edges.zip files')
+    parser.add_argument('outpath', help='directory for the SSCCC.csv files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of counties converted in parallel (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true',
+                        help='convert all counties, even those unchanged since the last run')
+    parser.add_argument('--streaming', action='store_true',
+                        help='write address ways while reading, keeping only one way in memory')
+    parser.add_argument('--batched', action='store_true',
+                        help='read the shapefile in columnar batches instead of feature by feature')
+    parser.add_argument('--engine', choices=('scalar', 'numpy'), default='scalar',
+                        help='compute the address way geometries point by point or vectorised')
+    parser.add_argument('--nodestore', action='store_true',
+                        help='keep nodes in compact arrays instead of a dict (uses less memory)')
+    parser.add_argument('--tlid', action='store_true',
+                        help='add the TLID of each edge as first column (needed by tiger_address_delta.py)')
+    parser.add_argument('--compress', choices=('gzip', 'zstd'),
+                        help='write <countyid>.csv.gz or .csv.zst files (zstd needs the zstandard package)')
+    parser.add_argument('--single-file', metavar='FILE',
+                        help='also append all counties to FILE with a single header'
+                             ' (compressed like the county files)')
+    parser.add_argument('--format', choices=('csv', 'parquet', 'pgcopy'), default='csv',
+                        help='output as CSV, GeoParquet (needs pyarrow) or PostgreSQL binary COPY')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='let each worker read the next county while converting the current one and'
+                             ' writing the previous one (more memory, not with --streaming)')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='keep the parsed and compiled data in DIR and reuse it on later runs'
+                             ' instead of reading the shapefile again (implies --nodestore)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='append the time, CPU time, peak memory and item counts of each stage'
+                             ' to FILE as JSON lines')
+    args = parser.parse_args()
+
+    for path in (args.inpath, args.outpath):
+        if not os.path.isdir(path):
+            sys.exit("%s does not exist" % path)
+
+    options = {'streaming': args.streaming, 'batched': args.batched, 'engine': args.engine,
+               'nodestore': args.nodestore, 'tlid': args.tlid, 'compression': args.compress,
+               'output_format': args.format}
+
+    failed = convert_all(args.inpath, args.outpath, workers=args.workers, options=options,
+                         force=args.force, report_filename=args.report, single_filename=args.single_file,
+                         pipeline=args.pipeline, cache_dir=args.cache)
+    if failed:
+        sys.exit("Conversion failed for: %s" % ' '.join(failed))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+"""
+Compares two conversions (e.g. of last and this year's TIGER release) made
+with --tlid and writes only the rows of TLIDs that were added, removed or
+changed, so a database can be updated instead of reloaded.
+
+    ./tiger_address_delta.py old/ new/ delta.csv
+"""
+
+import argparse
+import tempfile
+
+from lib.delta import write_delta, BUCKETS
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes the delta of two conversions made with --tlid')
+    parser.add_argument('old', help='CSV file or directory of CSV files')
+    parser.add_argument('new', help='CSV file or directory of CSV files')
+    parser.add_argument('delta', help='output CSV file')
+    parser.add_argument('--buckets', type=int, default=BUCKETS,
+                        help='number of on-disk buckets, more need less memory (default: %d)' % BUCKETS)
+    parser.add_argument('--tmpdir', help='directory for the buckets (default: system temp directory)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='tiger-delta-', dir=args.tmpdir) as tmpdir:
+        counts = write_delta(args.old, args.new, args.delta, tmpdir, args.buckets)
+
+    print("TLIDs added: %(added)d, removed: %(removed)d, changed: %(changed)d, unchanged: %(unchanged)d"
+          % counts)